@@ -159,13 +159,18 @@ const api = {
         });
     },
 
-    async getAllBookmarks(skip = 0, limit = 50, tagPrefix = null, query = null) {
-        let url = `/bookmarks?skip=${skip}&limit=${limit}`;
+    async getAllBookmarks(skip = 0, limit = 50, tagPrefix = null, query = null, cursor = null) {
+        let url = `/bookmarks?skip=${cursor ? 0 : skip}&limit=${limit}`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
         if (tagPrefix) url += `&tag_prefix=${encodeURIComponent(tagPrefix)}`;
         if (query) url += `&query=${encodeURIComponent(query)}`;
         return this._fetch(url, { method: 'GET' });
     },
 
+    async getBookmarkContent(id) {
+        return this._fetch(`/bookmarks/${id}/content`, { method: 'GET' });
+    },
+
     async getTags() {
         return this._fetch('/tags', { method: 'GET' });
     },
@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', () => {
         total: 0,
         skip: 0,
         limit: 50,
+        cursors: [null], // cursors[n] starts page n (keyset pagination)
         tagPrefix: null,
         query: null,
         selectedBookmarkId: null,
@@ -100,9 +101,13 @@ document.addEventListener('DOMContentLoaded', () => {
     async function loadBookmarks() {
         try {
             tableBody.innerHTML = '<tr><td colspan="5" style="text-align: center;">Loading...</td></tr>';
-            const response = await window.api.getAllBookmarks(state.skip, state.limit, state.tagPrefix, state.query);
+            if (state.skip === 0) state.cursors = [null];
+            const page = Math.floor(state.skip / state.limit);
+            const response = await window.api.getAllBookmarks(state.skip, state.limit, state.tagPrefix, state.query, state.cursors[page] || null);
             state.bookmarks = response.items;
-            state.total = response.total;
+            // Filtered cursor pages omit the total; keep the first page's
+            if (response.total !== null && response.total !== undefined) state.total = response.total;
+            state.cursors[page + 1] = response.next_cursor || null;
             
             // Reset selections
             state.selectedBookmarkIds.clear();
@@ -326,7 +331,15 @@ document.addEventListener('DOMContentLoaded', () => {
         editUrl.value = bookmark.url;
         editUrlLink.href = bookmark.url;
         editTags.value = bookmark.tags.join(', ');
-        contentPreviewBox.textContent = bookmark.content_markdown || 'No content available.';
+        // List responses omit the article body; load it on demand
+        contentPreviewBox.textContent = 'Loading content...';
+        window.api.getBookmarkContent(bookmark.id).then((res) => {
+            if (state.selectedBookmarkId !== bookmark.id) return;
+            contentPreviewBox.textContent = res.content_markdown || 'No content available.';
+        }).catch(() => {
+            if (state.selectedBookmarkId !== bookmark.id) return;
+            contentPreviewBox.textContent = 'No content available.';
+        });
     }
 
     function updateBulkToolbar() {
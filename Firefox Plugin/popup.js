@@ -139,7 +139,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const pollInterval = setInterval(async () => {
                     try {
                         const status = await window.api.getReembedStatus();
-                        if (!status || status.status === "none" || status.status === "starting") {
+                        if (!status || status.status === "none" || status.status === "pending") {
                             reembedBtn.textContent = 'Starting...';
                         } else if (status.status === "running") {
                             const percent = status.total > 0 ? Math.round((status.processed / status.total) * 100) : 0;
@@ -152,9 +152,9 @@ document.addEventListener('DOMContentLoaded', () => {
                                 reembedBtn.textContent = 'Reembed your bookmarks...';
                                 settingsDropdown.classList.add('hidden');
                             }, 2000);
-                        } else if (status.status === "failed") {
+                        } else if (status.status === "failed" || status.status === "cancelled") {
                             clearInterval(pollInterval);
-                            reembedBtn.textContent = 'Failed!';
+                            reembedBtn.textContent = status.status === "cancelled" ? 'Cancelled' : 'Failed!';
                             console.error("Re-embed failed:", status.error);
                             setTimeout(() => {
                                 reembedBtn.disabled = false;
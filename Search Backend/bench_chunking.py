@@ -0,0 +1,140 @@
+"""
+Compares the fixed-width splitter with the markdown/token chunker on a corpus.
+
+For each splitter it reports chunk count, mean chunk tokens, chunking and
+embedding time, and retrieval quality: sentences sampled from each document
+are used as queries against all chunks of the corpus, scoring whether the
+source document ranks first (recall@1), in the top 5 (recall@5) and its
+mean reciprocal rank. Embeds with the configured EMBEDDING_PROVIDER,
+bypassing the embedding cache.
+
+    python bench_chunking.py                   # bundled bench_corpus/
+    python bench_chunking.py --corpus DIR      # *.md / *.txt files
+    python bench_chunking.py --from-db 200     # bookmarks from the database
+"""
+import argparse
+import asyncio
+import random
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, List
+import numpy as np
+from sqlmodel import col, select
+from chunking import split_text
+from tokenizer import count_tokens_batch
+from services import get_provider, split_for
+
+_SENTENCE = re.compile(r"[^.!?\n]{40,300}[.!?]")
+_DEFAULT_CORPUS = Path(__file__).parent / "bench_corpus"
+
+
+def _load_corpus(directory: str) -> List[str]:
+    paths = sorted(
+        p for p in Path(directory).rglob("*") if p.suffix in (".md", ".txt")
+    )
+    return [p.read_text(encoding="utf-8") for p in paths]
+
+
+async def _load_bookmarks(limit: int) -> List[str]:
+    from database import AsyncSessionLocal
+    from models import Bookmark
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Bookmark.content_markdown).where(
+                col(Bookmark.content_markdown).is_not(None)
+            ).limit(limit)
+        )
+        return [c for c in result.scalars().all() if c]
+
+
+def _queries(docs: List[str], per_doc: int) -> List[tuple[int, str]]:
+    rng = random.Random(0)
+    queries = []
+    for i, doc in enumerate(docs):
+        sentences = [m.group(0).strip() for m in _SENTENCE.finditer(doc)]
+        for sentence in rng.sample(sentences, min(per_doc, len(sentences))):
+            queries.append((i, sentence))
+    return queries
+
+
+def _normalize(vectors: Any) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+async def _evaluate(
+    name: str,
+    split: Callable[[str], List[str]],
+    docs: List[str],
+    queries: List[tuple[int, str]],
+    query_matrix: np.ndarray,
+    provider: Any,
+) -> None:
+    started = time.perf_counter()
+    owners, chunks = [], []
+    for i, doc in enumerate(docs):
+        for chunk in split(doc):
+            owners.append(i)
+            chunks.append(chunk)
+    chunk_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunk_matrix = _normalize(await provider.embed_documents(chunks))
+    embed_seconds = time.perf_counter() - started
+
+    # Rank documents by their best chunk for every query
+    scores = query_matrix @ chunk_matrix.T
+    owners_arr = np.asarray(owners)
+    doc_scores = np.full((len(queries), len(docs)), -np.inf, dtype=np.float32)
+    for d in range(len(docs)):
+        mask = owners_arr == d
+        if mask.any():
+            doc_scores[:, d] = scores[:, mask].max(axis=1)
+    targets = np.asarray([d for d, _ in queries])
+    target_scores = doc_scores[np.arange(len(queries)), targets]
+    ranks = (doc_scores > target_scores[:, None]).sum(axis=1) + 1
+
+    tokens = count_tokens_batch(chunks)
+    print(
+        f"{name:<10} chunks={len(chunks):>6}  "
+        f"tokens/chunk={sum(tokens) / len(chunks):6.1f}  "
+        f"total tokens={sum(tokens):>8}  "
+        f"chunk={chunk_seconds * 1000:7.1f}ms  embed={embed_seconds:6.2f}s  "
+        f"R@1={(ranks == 1).mean():.3f}  R@5={(ranks <= 5).mean():.3f}  "
+        f"MRR={(1 / ranks).mean():.3f}"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    docs = (
+        await _load_bookmarks(args.from_db) if args.from_db
+        else _load_corpus(args.corpus)
+    )
+    provider = get_provider()
+    inner: Any = getattr(provider, "inner", provider)
+    queries = _queries(docs, args.queries_per_doc)
+    print(
+        f"{len(docs)} documents, {len(queries)} queries, provider {provider.name} "
+        f"(chunk_tokens={provider.chunk_tokens}, overlap={provider.chunk_overlap})"
+    )
+    query_matrix = _normalize(await inner.embed_queries([q for _, q in queries]))
+    await _evaluate("fixed", split_text, docs, queries, query_matrix, inner)
+    await _evaluate(
+        "markdown", lambda doc: split_for(provider, doc),
+        docs, queries, query_matrix, inner,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--corpus", default=str(_DEFAULT_CORPUS),
+        help="directory of .md/.txt documents (default: bundled bench_corpus/)",
+    )
+    source.add_argument("--from-db", type=int, metavar="N")
+    parser.add_argument("--queries-per-doc", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
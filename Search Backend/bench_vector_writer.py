@@ -0,0 +1,138 @@
+"""
+Measures embedding-row write throughput for 384- and 1536-dim vectors.
+
+Always times payload encoding (no database needed): the previous text-format
+COPY rendering against vector_writer's binary encoding. With --db it also
+writes into a temporary table through an executemany INSERT (what the ORM
+path issued), text COPY and binary COPY, and reports rows/sec for each.
+
+    python bench_vector_writer.py [--rows 5000] [--db]
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+from typing import Callable, List
+from uuid import UUID, uuid4
+import numpy as np
+from pgvector.sqlalchemy import VECTOR
+from sqlalchemy import Column, Integer, MetaData, Table, Text, insert, text
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from vector_writer import COLUMNS, encode_embeddings
+
+USER_ID = "bench-user"
+
+
+def _copy_escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def encode_text(user_id: str, rows: List[tuple[UUID, int, str]], vectors) -> bytes:
+    """The text-format COPY payload written before the binary writer."""
+    return "".join(
+        f"{uuid4()}\t{bookmark_id}\t{_copy_escape(user_id)}\t{chunk_index}\t"
+        f"{_copy_escape(chunk_text)}\t"
+        f"{hashlib.sha256(chunk_text.encode('utf-8')).hexdigest()}\t"
+        f"[{','.join(map(str, vector))}]\n"
+        for (bookmark_id, chunk_index, chunk_text), vector in zip(rows, vectors)
+    ).encode("utf-8")
+
+
+def _fixture(n: int, dim: int):
+    rng = np.random.default_rng(0)
+    bookmark_ids = [uuid4() for _ in range(max(n // 8, 1))]
+    rows = [
+        (bookmark_ids[i % len(bookmark_ids)], i, f"chunk {i} " + "lorem ipsum " * 80)
+        for i in range(n)
+    ]
+    matrix = rng.standard_normal((n, dim), dtype=np.float32)
+    # Lists of floats are what providers returned before the float32 matrix
+    return rows, matrix, matrix.tolist()
+
+
+def _rate(n: int, fn: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - started)
+
+
+async def _timed(n: int, coro) -> float:
+    started = time.perf_counter()
+    await coro
+    return n / (time.perf_counter() - started)
+
+
+async def _bench_db(dim: int, rows, matrix, lists) -> None:
+    from database import engine
+    table = Table(
+        f"bench_embeddings_{dim}", MetaData(),
+        Column("id", PG_UUID(as_uuid=True)),
+        Column("bookmark_id", PG_UUID(as_uuid=True)),
+        Column("user_id", Text),
+        Column("chunk_index", Integer),
+        Column("chunk_text", Text),
+        Column("chunk_hash", Text),
+        Column("embedding", VECTOR(dim)),
+    )
+    n = len(rows)
+    async with engine.connect() as conn:
+        await conn.execute(text(
+            f"CREATE TEMP TABLE {table.name} (id UUID, bookmark_id UUID, "
+            f"user_id TEXT, chunk_index INTEGER, chunk_text TEXT, "
+            f"chunk_hash TEXT, embedding VECTOR({dim}))"
+        ))
+        raw = (await conn.get_raw_connection()).driver_connection
+
+        params = [
+            {
+                "id": uuid4(), "bookmark_id": b, "user_id": USER_ID,
+                "chunk_index": i, "chunk_text": t,
+                "chunk_hash": hashlib.sha256(t.encode("utf-8")).hexdigest(),
+                "embedding": v,
+            }
+            for (b, i, t), v in zip(rows, lists)
+        ]
+        copy = raw.copy_to_table  # type: ignore[union-attr]
+        results = {
+            "executemany": await _timed(n, conn.execute(insert(table), params)),
+            "text COPY": await _timed(n, copy(
+                table.name, source=encode_text(USER_ID, rows, lists),
+                columns=COLUMNS, format="text",
+            )),
+            "binary COPY": await _timed(n, copy(
+                table.name, source=encode_embeddings(USER_ID, rows, matrix),
+                columns=COLUMNS, format="binary",
+            )),
+        }
+        await conn.rollback()
+    for name, rate in results.items():
+        print(f"  db     {name:<12} {rate:>10,.0f} rows/sec")
+    await engine.dispose()
+
+
+async def main(args: argparse.Namespace) -> None:
+    for dim in (384, 1536):
+        rows, matrix, lists = _fixture(args.rows, dim)
+        print(f"dim={dim}, rows={args.rows}")
+        for name, fn in (
+            ("text", lambda: encode_text(USER_ID, rows, lists)),
+            ("binary/list", lambda: encode_embeddings(USER_ID, rows, lists)),
+            ("binary/array", lambda: encode_embeddings(USER_ID, rows, matrix)),
+        ):
+            print(f"  encode {name:<12} {_rate(args.rows, fn):>10,.0f} rows/sec")
+        if args.db:
+            await _bench_db(dim, rows, matrix, lists)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--db", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+import re
+from typing import List
+from tokenizer import count_tokens, count_tokens_batch, split_tokens
+
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s")
+# Sentence ends: terminal punctuation followed by whitespace and something
+# that can start a sentence. Good enough for prose; code is split by line.
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[*_A-Z0-9])")
+
+
+def split_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    """The original fixed-width splitter, kept as the benchmark baseline."""
+    if len(text) <= chunk_size:
+        return [text]
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        chunks.append(text[start:end])
+        start += chunk_size - overlap
+    return chunks
+
+
+def _blocks(text: str) -> List[tuple[str, bool, bool]]:
+    """
+    Splits markdown into (text, is_heading, is_code) blocks: ATX headings,
+    blank-line separated paragraphs and whole fenced code blocks.
+    """
+    blocks: List[tuple[str, bool, bool]] = []
+    lines: List[str] = []
+    fence = ""
+
+    def flush(is_code: bool = False) -> None:
+        if lines:
+            blocks.append(("\n".join(lines), False, is_code))
+            lines.clear()
+
+    for line in text.splitlines():
+        if fence:
+            lines.append(line)
+            if line.strip().startswith(fence):
+                flush(is_code=True)
+                fence = ""
+            continue
+        match = _FENCE.match(line)
+        if match:
+            flush()
+            fence = match.group(1)
+            lines.append(line)
+        elif _HEADING.match(line):
+            flush()
+            blocks.append((line.strip(), True, False))
+        elif not line.strip():
+            flush()
+        else:
+            lines.append(line)
+    flush(is_code=bool(fence))
+    return blocks
+
+
+def _pack(pieces: List[str], sizes: List[int], max_tokens: int, sep: str) -> List[str]:
+    """Greedily joins consecutive pieces into parts of at most `max_tokens`."""
+    parts: List[str] = []
+    current: List[str] = []
+    size = 0
+    for piece, n in zip(pieces, sizes):
+        if current and size + n > max_tokens:
+            parts.append(sep.join(current))
+            current, size = [], 0
+        if n > max_tokens:
+            parts.extend(split_tokens(piece, max_tokens))
+            continue
+        current.append(piece)
+        size += n
+    if current:
+        parts.append(sep.join(current))
+    return parts
+
+
+def _split_block(text: str, is_code: bool, max_tokens: int) -> List[str]:
+    # Prose breaks between sentences, code between lines; a single sentence
+    # or line over the limit is cut by tokens
+    pieces = text.split("\n") if is_code else _SENTENCE_END.split(text)
+    sep = "\n" if is_code else " "
+    return _pack(pieces, count_tokens_batch(pieces), max_tokens, sep)
+
+
+def chunk_markdown(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """
+    Splits markdown into chunks of at most about `max_tokens` tokens (see
+    tokenizer.py) along its structure. Paragraphs and fenced code blocks are
+    kept whole where they fit; larger ones break between sentences or lines.
+    A heading starts a new chunk once the current one holds a quarter of the
+    budget, so small sections still share a chunk. When a chunk is closed
+    for size rather than at a heading, its trailing blocks of up to
+    `overlap_tokens` tokens are repeated at the start of the next one.
+
+    A text that fits in one chunk is returned unchanged.
+    """
+    if not text.strip():
+        return []
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    blocks = _blocks(text)
+    sizes = count_tokens_batch([b for b, _, _ in blocks])
+    units: List[tuple[str, int, bool]] = []
+    for (block, is_heading, is_code), n in zip(blocks, sizes):
+        if n <= max_tokens:
+            units.append((block, n, is_heading))
+            continue
+        parts = _split_block(block, is_code, max_tokens)
+        units.extend(
+            (part, m, False) for part, m in zip(parts, count_tokens_batch(parts))
+        )
+
+    min_tokens = max_tokens // 4
+    chunks: List[str] = []
+    current: List[tuple[str, int, bool]] = []
+    size = 0
+    for unit in units:
+        _, n, is_heading = unit
+        # +1 per unit for the blank line joining it to the previous one
+        at_heading = is_heading and size >= min_tokens
+        if current and (size + n + 1 > max_tokens or at_heading):
+            chunks.append("\n\n".join(u[0] for u in current))
+            carry: List[tuple[str, int, bool]] = []
+            if not at_heading:
+                budget = min(overlap_tokens, max_tokens - n - 1)
+                for prev in reversed(current):
+                    if prev[1] + 1 > budget:
+                        break
+                    carry.insert(0, prev)
+                    budget -= prev[1] + 1
+            current = carry
+            size = sum(u[1] + 1 for u in carry)
+        current.append(unit)
+        size += n + 1
+    if current:
+        chunks.append("\n\n".join(u[0] for u in current))
+    return chunks
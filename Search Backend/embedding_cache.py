@@ -0,0 +1,261 @@
+from array import array
+from collections import OrderedDict
+from typing import Any, List, Optional, Type
+import numpy as np
+from sqlalchemy import text
+from database import engine
+import hashlib
+import time
+
+
+def text_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class MemoryVectorLRU:
+    """
+    Byte-bounded LRU of vectors, with optional per-entry TTL. Entries are
+    stored as packed float32 arrays (4 bytes per dimension) rather than lists
+    of boxed floats, which would cost ~8x more memory per entry.
+    """
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: OrderedDict[str, tuple[float, array]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[array]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, vector = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return vector
+
+    def put(self, key: str, vector: array) -> None:
+        size = vector.itemsize * len(vector)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+        self._entries[key] = (expires_at, vector)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, vector = self._entries.pop(key)
+        self.bytes -= vector.itemsize * len(vector)
+
+
+class PostgresVectorStore:
+    """
+    Durable cache tier in the `embedding_cache` table (created in `lifespan`).
+    Uses its own short-lived connections so lookups never join the caller's
+    transaction. Recency is tracked coarsely: a hit only rewrites
+    `last_used_at` once it is older than `touch_after` seconds, so repeat
+    lookups stay reads. Every `prune_every` inserts, up to that many rows
+    beyond `max_rows` (by the planner's row estimate) are pruned
+    least-recently-used first, walking the `last_used_at` index.
+    """
+
+    def __init__(
+        self, max_rows: int, prune_every: int = 1000, touch_after: float = 3600
+    ):
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self.touch_after = touch_after
+        self._inserts_since_prune = 0
+
+    async def get_many(self, namespace: str, keys: List[str]) -> dict[str, array]:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("""
+                WITH hits AS (
+                    SELECT text_hash, embedding, last_used_at FROM embedding_cache
+                    WHERE namespace = :ns
+                        AND text_hash = ANY(CAST(:keys AS TEXT[]))
+                ), touched AS (
+                    UPDATE embedding_cache SET last_used_at = now()
+                    WHERE namespace = :ns AND text_hash IN (
+                        SELECT text_hash FROM hits WHERE last_used_at
+                            < now() - make_interval(secs => :touch_after)
+                    )
+                )
+                SELECT text_hash, embedding FROM hits
+            """), {"ns": namespace, "keys": keys, "touch_after": self.touch_after})
+            found = {}
+            for key, blob in result.all():
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector
+            return found
+
+    async def put_many(self, namespace: str, entries: dict[str, array]) -> None:
+        async with engine.begin() as conn:
+            await conn.execute(text("""
+                INSERT INTO embedding_cache (namespace, text_hash, embedding)
+                SELECT :ns, k, e
+                FROM unnest(
+                    CAST(:keys AS TEXT[]), CAST(:blobs AS BYTEA[])
+                ) AS t(k, e)
+                ON CONFLICT (namespace, text_hash) DO NOTHING
+            """), {
+                "ns": namespace,
+                "keys": list(entries),
+                "blobs": [v.tobytes() for v in entries.values()],
+            })
+            self._inserts_since_prune += len(entries)
+            if self._inserts_since_prune >= self.prune_every:
+                self._inserts_since_prune = 0
+                # reltuples instead of count(*): no full scan, and capping
+                # each round at prune_every bounds the cost of a stale estimate
+                await conn.execute(text("""
+                    DELETE FROM embedding_cache
+                    WHERE (namespace, text_hash) IN (
+                        SELECT namespace, text_hash FROM embedding_cache
+                        ORDER BY last_used_at
+                        LIMIT LEAST(GREATEST((
+                            SELECT reltuples::bigint FROM pg_class
+                            WHERE oid = 'embedding_cache'::regclass
+                        ) - :max_rows, 0), :batch)
+                    )
+                """), {"max_rows": self.max_rows, "batch": self.prune_every})
+
+
+class CachedEmbeddingProvider:
+    """
+    Wraps any EmbeddingProvider with two independent caches:
+
+    - documents: `embed_documents` only computes vectors for texts not seen
+      before under the same (provider, model, dimension). Lookups go memory
+      LRU -> durable store -> inner provider.
+    - queries: a TTL'd LRU in front of `embed_query`, so re-issued searches
+      skip inference. Kept apart from documents because the local model
+      encodes queries differently.
+    """
+
+    def __init__(
+        self,
+        inner: Any,
+        memory: Optional[MemoryVectorLRU] = None,
+        store: Optional[PostgresVectorStore] = None,
+        queries: Optional[MemoryVectorLRU] = None,
+    ):
+        self.inner = inner
+        self.name: str = inner.name
+        self.dimension: int = inner.dimension
+        self.table_name: str = inner.table_name
+        self.threshold: float = inner.threshold
+        self.chunk_tokens: int = inner.chunk_tokens
+        self.chunk_overlap: int = inner.chunk_overlap
+        self.model_class: Type[Any] = inner.model_class
+        self.namespace = (
+            f"{inner.name}:{getattr(inner, 'model_name', '')}:{inner.dimension}"
+        )
+        self.memory = memory
+        self.store = store
+        self.queries = queries
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def stats(self) -> dict:
+        stats: dict[str, Any] = {"namespace": self.namespace}
+        if self.memory is not None:
+            stats["documents"] = {
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory.bytes,
+                "memory_evictions": self.memory.evictions,
+            }
+        if self.queries is not None:
+            stats["queries"] = {
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+                "entries": len(self.queries),
+                "bytes": self.queries.bytes,
+                "evictions": self.queries.evictions,
+                "expirations": self.queries.expirations,
+            }
+        return stats
+
+    async def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if self.memory is None:
+            return await self.inner.embed_documents(texts)
+        keys = [text_hash(t) for t in texts]
+        found: dict[str, array] = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+        self.memory_hits += sum(1 for k in keys if k in found)
+
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing and self.store is not None:
+            try:
+                stored = await self.store.get_many(self.namespace, missing)
+            except Exception as e:
+                # The cache is an optimisation; never fail ingestion over it
+                print(f"Warning: embedding cache lookup failed: {e}")
+                stored = {}
+            for key, vector in stored.items():
+                self.memory.put(key, vector)
+            found.update(stored)
+            self.store_hits += sum(1 for k in keys if k in stored)
+            missing = [k for k in missing if k not in stored]
+
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            computed = await self.inner.embed_documents(
+                [text_by_key[k] for k in missing]
+            )
+            fresh = {
+                k: array("f", row.tobytes()) for k, row in zip(missing, computed)
+            }
+            self.misses += len(missing)
+            for key, vector in fresh.items():
+                self.memory.put(key, vector)
+            found.update(fresh)
+            if self.store is not None:
+                try:
+                    await self.store.put_many(self.namespace, fresh)
+                except Exception as e:
+                    print(f"Warning: embedding cache write failed: {e}")
+
+        matrix = np.empty((len(keys), self.dimension), dtype=np.float32)
+        for i, key in enumerate(keys):
+            matrix[i] = np.frombuffer(found[key], dtype=np.float32)
+        return matrix
+
+    async def embed_query(self, text: str) -> List[float]:
+        if self.queries is None:
+            return await self.inner.embed_query(text)
+        # Whitespace-only variants (trailing space while typing) share a vector
+        normalized = " ".join(text.split())
+        vector = self.queries.get(normalized)
+        if vector is not None:
+            self.query_hits += 1
+            return vector.tolist()
+        self.query_misses += 1
+        vector = array("f", await self.inner.embed_query(normalized))
+        self.queries.put(normalized, vector)
+        return vector.tolist()
@@ -0,0 +1,218 @@
+import asyncio
+import time
+import traceback
+from typing import Any, List, Optional
+from uuid import UUID, uuid4
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import AsyncSessionLocal
+from models import Bookmark
+from services import ingestion_service
+import metrics
+import settings
+
+
+class IngestQueue:
+    """
+    Embeds saved bookmarks in the background, tracked per bookmark in the
+    `ingest_jobs` table, so saving one only costs its metadata write.
+
+    `submit` saves the bookmark and queues its job in one transaction.
+    INGEST_WORKERS workers per process claim queued jobs with SKIP LOCKED and
+    run IngestionService.index_bookmark. A failed job is retried after
+    INGEST_RETRY_SECONDS, doubling per attempt, until INGEST_MAX_ATTEMPTS;
+    one left `processing` for INGEST_STALE_SECONDS (its worker died) is
+    claimed again. Workers wake on local submits and otherwise poll every
+    INGEST_POLL_SECONDS, which also picks up retries and other instances'
+    jobs.
+
+    Re-saving a bookmark while its job runs sets `rerun`, and the job is
+    queued again once the current run ends, so one bookmark is never
+    indexed by two workers at once.
+    """
+
+    def __init__(self):
+        self.worker_id = str(uuid4())
+        self._workers: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._busy = 0
+        metrics.register_gauge("ingest_queue", self.stats)
+
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._work(self._wake))
+            for _ in range(settings.INGEST_WORKERS)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        # Hand interrupted jobs back at once instead of waiting for staleness
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("""
+                UPDATE ingest_jobs
+                SET status = 'queued', owner = NULL, updated_at = now()
+                WHERE owner = :owner AND status = 'processing'
+            """), {"owner": self.worker_id})
+            await session.commit()
+
+    def stats(self) -> dict:
+        return {"workers": len(self._workers), "busy": self._busy}
+
+    async def submit(
+        self,
+        session: AsyncSession,
+        user_id: str,
+        url: str,
+        title: str,
+        content: str,
+        tags: List[str],
+    ) -> Bookmark:
+        bookmark = await ingestion_service.save_bookmark(
+            session, user_id, url, title, content, tags
+        )
+        await session.execute(text("""
+            INSERT INTO ingest_jobs (bookmark_id) VALUES (:bookmark_id)
+            ON CONFLICT (bookmark_id) DO UPDATE SET
+                status = CASE WHEN ingest_jobs.status = 'processing'
+                    THEN 'processing' ELSE 'queued' END,
+                rerun = ingest_jobs.status = 'processing',
+                attempts = 0,
+                error = NULL,
+                available_at = now(),
+                updated_at = now()
+        """), {"bookmark_id": bookmark.id})
+        await session.commit()
+        await session.refresh(bookmark)
+        metrics.incr("ingest_queue.submitted")
+        if self._wake is not None:
+            self._wake.set()
+        return bookmark
+
+    async def status(self, user_id: str, bookmark_id: UUID) -> Optional[dict]:
+        """
+        Ingestion state of one of the user's bookmarks, or None if it does
+        not exist. Bookmarks saved before the queue have no job and count as
+        ingested.
+        """
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(text("""
+                SELECT b.id, j.status, j.attempts, j.error, j.updated_at
+                FROM bookmarks b
+                LEFT JOIN ingest_jobs j ON j.bookmark_id = b.id
+                WHERE b.id = :bookmark_id AND b.user_id = :uid
+            """), {"bookmark_id": bookmark_id, "uid": user_id})).first()
+        if row is None:
+            return None
+        return {
+            "id": str(row.id),
+            "status": row.status or "ingested",
+            "attempts": row.attempts or 0,
+            "error": row.error,
+            "updated_at": row.updated_at,
+        }
+
+    async def _work(self, wake: asyncio.Event) -> None:
+        while True:
+            try:
+                wake.clear()
+                job = await self._claim()
+            except Exception as e:
+                print(f"Warning: ingest queue claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(wake.wait(), settings.INGEST_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._busy += 1
+            try:
+                await self._run(job)
+            except Exception as e:
+                print(f"Warning: ingest job {job.bookmark_id} not finished: {e}")
+            finally:
+                self._busy -= 1
+
+    async def _claim(self) -> Optional[Any]:
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(text("""
+                UPDATE ingest_jobs
+                SET status = 'processing', owner = :owner,
+                    claimed_at = now(), updated_at = now()
+                WHERE bookmark_id = (
+                    SELECT bookmark_id FROM ingest_jobs
+                    WHERE (status = 'queued' AND available_at <= now()) OR (
+                        status = 'processing'
+                        AND claimed_at < now() - make_interval(secs => :stale)
+                    )
+                    ORDER BY available_at
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING bookmark_id,
+                    EXTRACT(EPOCH FROM now() - available_at) AS waited
+            """), {
+                "owner": self.worker_id,
+                "stale": settings.INGEST_STALE_SECONDS,
+            })).first()
+            await session.commit()
+        return row
+
+    async def _run(self, job: Any) -> None:
+        metrics.observe("ingest_queue.wait_seconds", float(job.waited))
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as session:
+                await ingestion_service.index_bookmark(session, job.bookmark_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            metrics.incr("ingest_queue.failures")
+            await self._finish(job.bookmark_id, str(e))
+            return
+        metrics.observe("ingest_queue.run_seconds", time.perf_counter() - started)
+        await self._finish(job.bookmark_id)
+
+    async def _finish(self, bookmark_id: UUID, error: Optional[str] = None) -> None:
+        # A job re-saved meanwhile runs again right away; the owner check
+        # skips jobs another worker has taken over as stale
+        params: dict[str, Any] = {
+            "bookmark_id": bookmark_id, "owner": self.worker_id,
+        }
+        if error is None:
+            sql = """
+                UPDATE ingest_jobs
+                SET status = CASE WHEN rerun THEN 'queued' ELSE 'ingested' END,
+                    rerun = false, owner = NULL, available_at = now(),
+                    updated_at = now()
+                WHERE bookmark_id = :bookmark_id AND owner = :owner
+            """
+        else:
+            sql = """
+                UPDATE ingest_jobs
+                SET status = CASE WHEN rerun OR attempts + 1 < :max_attempts
+                        THEN 'queued' ELSE 'failed' END,
+                    available_at = CASE WHEN rerun THEN now()
+                        ELSE now() + make_interval(
+                            secs => :retry * power(2, attempts)
+                        ) END,
+                    attempts = CASE WHEN rerun THEN 0 ELSE attempts + 1 END,
+                    error = :error, rerun = false, owner = NULL,
+                    updated_at = now()
+                WHERE bookmark_id = :bookmark_id AND owner = :owner
+            """
+            params.update(
+                error=error,
+                max_attempts=settings.INGEST_MAX_ATTEMPTS,
+                retry=settings.INGEST_RETRY_SECONDS,
+            )
+        async with AsyncSessionLocal() as session:
+            await session.execute(text(sql), params)
+            await session.commit()
+
+
+ingest_queue = IngestQueue()
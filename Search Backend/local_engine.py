@@ -0,0 +1,161 @@
+import asyncio
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, List, Optional
+import numpy as np
+import metrics
+
+QUERY = 0
+DOCUMENTS = 1
+
+_process_model: Any = None
+
+
+def _load_model(model_name: str, threads: int) -> Any:
+    from fastembed import TextEmbedding
+    return TextEmbedding(model_name, threads=threads)
+
+
+def _init_process(model_name: str, threads: int) -> None:
+    global _process_model
+    _process_model = _load_model(model_name, threads)
+
+
+def _run(model: Any, kind: int, texts: List[str]) -> np.ndarray:
+    # parallel=None: the engine owns parallelism; fastembed's own data-parallel
+    # mode would spawn another process pool per call. One float32 matrix per
+    # job also crosses the process boundary as a single buffer.
+    if kind == QUERY:
+        vectors = model.query_embed(texts, parallel=None)
+    else:
+        vectors = model.embed(texts, parallel=None)
+    return np.array(list(vectors), dtype=np.float32)
+
+
+def _run_in_process(kind: int, texts: List[str]) -> np.ndarray:
+    return _run(_process_model, kind, texts)
+
+
+class LocalEmbeddingEngine:
+    """
+    Runs fastembed inference for LocalEmbeddingProvider on `workers` parallel
+    executors, either threads sharing one ONNX session (`mode="thread"`) or
+    processes each holding a model replica (`mode="process"`, ~150 MB RSS per
+    worker). `threads` sets intra-op threads per session.
+
+    Document batches are split into `sub_batch`-sized jobs so a query waits
+    for at most one in-flight job per worker, and queries are dequeued ahead
+    of queued document jobs. Only document jobs count against `queue_size`,
+    which bounds memory and applies backpressure to bulk ingestion without
+    ever blocking a search.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int = 1,
+        threads: int = 1,
+        mode: str = "thread",
+        queue_size: int = 64,
+        sub_batch: int = 16,
+    ):
+        self.workers = workers
+        self.mode = mode
+        self.queue_size = queue_size
+        self.sub_batch = sub_batch
+        self._model: Any = None
+        self._executor: Executor
+        if mode == "process":
+            # spawn, not the Linux fork default: forking the serving process
+            # would copy the event loop, open DB connections and any ONNX
+            # thread pools already started into each worker.
+            self._executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(model_name, threads),
+            )
+        elif mode == "thread":
+            self._model = _load_model(model_name, threads)
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix="embed")
+        else:
+            raise ValueError(f"Unknown LOCAL_EMBED_MODE: '{mode}'")
+        self._seq = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._document_slots: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _start(self) -> asyncio.PriorityQueue:
+        # Created lazily so the queue binds to the serving event loop
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._document_slots = asyncio.Semaphore(self.queue_size)
+            self._tasks = [
+                asyncio.create_task(self._worker(self._queue))
+                for _ in range(self.workers)
+            ]
+        return self._queue
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+        }
+
+    async def _worker(self, queue: asyncio.PriorityQueue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            kind, _, texts, future, enqueued_at = await queue.get()
+            if future.cancelled():
+                continue
+            metrics.observe(
+                "local_embed_wait_seconds."
+                + ("query" if kind == QUERY else "documents"),
+                time.perf_counter() - enqueued_at,
+            )
+            try:
+                if self._model is None:
+                    result = await loop.run_in_executor(
+                        self._executor, _run_in_process, kind, texts
+                    )
+                else:
+                    result = await loop.run_in_executor(
+                        self._executor, _run, self._model, kind, texts
+                    )
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    async def embed(self, kind: int, texts: List[str]) -> np.ndarray:
+        """Returns one float32 matrix with a row per text."""
+        queue = self._start()
+        slots = self._document_slots
+        assert slots is not None
+        loop = asyncio.get_running_loop()
+        # Queries are short and latency-bound: keep a coalesced batch whole
+        step = self.sub_batch if kind == DOCUMENTS else max(len(texts), 1)
+        futures = []
+        for i in range(0, len(texts), step):
+            future = loop.create_future()
+            if kind == DOCUMENTS:
+                await slots.acquire()
+                future.add_done_callback(lambda _: slots.release())
+            queue.put_nowait((
+                kind, next(self._seq), texts[i:i + step], future,
+                time.perf_counter(),
+            ))
+            futures.append(future)
+        try:
+            parts = await asyncio.gather(*futures)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
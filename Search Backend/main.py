@@ -1,15 +1,20 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks, Response
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from sqlalchemy import text
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlmodel import select
 
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import AsyncIterator, List, Optional
 from datetime import datetime
+import hmac
+import json
+import time
 import uvicorn
 import httpx
 from contextlib import asynccontextmanager
@@ -18,12 +23,21 @@ from uuid import UUID, uuid4
 from datetime import timedelta, timezone
 import jwt
 
-from database import get_session, engine
+from database import get_session, engine, AsyncSessionLocal
 from models import AllowedUser, RefreshToken, openai_dim
 import auth
+import metrics
 import settings
 
-from services import ingestion_service, search_service, management_service
+from services import (
+    configure_fts, ingestion_service, search_service, management_service,
+)
+from reembed_jobs import reembed_runner
+from ingest_queue import ingest_queue
+from memory_governor import memory_governor
+from migrate_fts import FTS_COLUMNS, ensure_fts
+from migrate_owner import CHUNK_TABLES, ensure_owner
+from recount import BOOKMARK_COUNTS, TAG_COUNTS
 # --- Pydantic Models ---
 
 class BookmarkIngestRequest(BaseModel):
@@ -42,6 +56,29 @@ class BookmarkResponse(BaseModel):
     updated_at: Optional[datetime] = None
     content_markdown: Optional[str] = None
 
+class BookmarkBatchIngestRequest(BaseModel):
+    bookmarks: List[BookmarkIngestRequest] = Field(
+        min_length=1, max_length=settings.INGEST_BATCH_MAX_ITEMS
+    )
+
+class BatchItemResult(BaseModel):
+    index: int
+    url: Optional[str] = None
+    id: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+
+class BatchIngestResponse(BaseModel):
+    items: List[BatchItemResult]
+    succeeded: int
+    failed: int
+    elapsed_seconds: float
+    docs_per_second: float
+
+class BookmarkContentResponse(BaseModel):
+    id: str
+    content_markdown: Optional[str] = None
+
 class BookmarkUpdateRequest(BaseModel):
     title: Optional[str] = None
     tags: Optional[List[str]] = None
@@ -59,9 +96,11 @@ class BulkAddRemoveTagRequest(BaseModel):
 
 class PaginatedBookmarksResponse(BaseModel):
     items: List[BookmarkResponse]
-    total: int
+    # None on cursor pages of a filtered listing; reuse the first page's total
+    total: Optional[int]
     skip: int
     limit: int
+    next_cursor: Optional[str] = None
 
 class TagCount(BaseModel):
     tag: str
@@ -76,6 +115,10 @@ class BulkDeleteResponse(BaseModel):
 class SearchRequest(BaseModel):
     query: str
     limit: int = 5
+    # Recall/latency knobs; unset means the server defaults
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    candidate_multiplier: Optional[int] = Field(default=None, ge=1, le=50)
+    exact: bool = False
 
 class SearchResult(BaseModel):
     id: str
@@ -104,7 +147,6 @@ class LogoutRequest(BaseModel):
     refresh_token: str
 
 
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Fail-fast check for JWT secret in production
@@ -120,6 +162,9 @@ async def lifespan(app: FastAPI):
     # Works on Railway managed Postgres and local Docker Compose alike.
     async with engine.begin() as conn:
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        search_service.configure_pgvector((await conn.execute(text(
+            "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+        ))).scalar())
         await conn.execute(text("""
             CREATE TABLE IF NOT EXISTS bookmarks (
                 id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -127,6 +172,7 @@ async def lifespan(app: FastAPI):
                 url TEXT NOT NULL,
                 title TEXT,
                 content_markdown TEXT,
+                content_hash TEXT,
                 tags TEXT[],
                 created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP WITH TIME ZONE,
@@ -139,39 +185,274 @@ async def lifespan(app: FastAPI):
                 "updated_at TIMESTAMP WITH TIME ZONE"
             )
         )
+        await conn.execute(text(
+            "ALTER TABLE bookmarks ADD COLUMN IF NOT EXISTS content_hash TEXT"
+        ))
         await conn.execute(text(
             "CREATE INDEX IF NOT EXISTS idx_bookmarks_user_id ON bookmarks(user_id)"
         ))
+        # Serves newest-first listing and keyset pagination on (created_at, id)
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_bookmarks_user_created_id "
+            "ON bookmarks (user_id, created_at DESC, id DESC)"
+        ))
+        # Per-user bookmark totals, kept current by statement-level triggers
+        seed_bookmark_counts = await conn.scalar(text(
+            "SELECT to_regclass('bookmark_counts') IS NULL"
+        ))
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS bookmark_counts (
+                user_id TEXT PRIMARY KEY,
+                total BIGINT NOT NULL DEFAULT 0
+            )
+        """))
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION bookmark_counts_apply() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO bookmark_counts (user_id, total)
+                    SELECT user_id, count(*) FROM changed GROUP BY user_id
+                    ON CONFLICT (user_id) DO UPDATE
+                        SET total = bookmark_counts.total + EXCLUDED.total;
+                ELSE
+                    UPDATE bookmark_counts c SET total = c.total - d.n
+                    FROM (
+                        SELECT user_id, count(*) AS n FROM changed GROUP BY user_id
+                    ) d
+                    WHERE c.user_id = d.user_id;
+                END IF;
+                RETURN NULL;
+            END $$
+        """))
+        await conn.execute(text("""
+            CREATE OR REPLACE TRIGGER bookmark_counts_insert
+            AFTER INSERT ON bookmarks REFERENCING NEW TABLE AS changed
+            FOR EACH STATEMENT EXECUTE FUNCTION bookmark_counts_apply()
+        """))
+        await conn.execute(text("""
+            CREATE OR REPLACE TRIGGER bookmark_counts_delete
+            AFTER DELETE ON bookmarks REFERENCING OLD TABLE AS changed
+            FOR EACH STATEMENT EXECUTE FUNCTION bookmark_counts_apply()
+        """))
+        # Seeded once, when the table is created alongside its triggers;
+        # recount.py rebuilds it if it ever drifts
+        if seed_bookmark_counts:
+            await conn.execute(text(BOOKMARK_COUNTS))
+        # Per-user tag index: one row per (user, tag) with its bookmark count,
+        # kept current by triggers so /tags never unnests the whole library
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_bookmarks_tags "
+            "ON bookmarks USING gin (tags)"
+        ))
+        seed_tag_counts = await conn.scalar(text(
+            "SELECT to_regclass('tag_counts') IS NULL"
+        ))
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS tag_counts (
+                user_id TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, tag)
+            )
+        """))
+        # Prefix lookups for hierarchical a/b/c tags (LIKE 'a/%')
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_tag_counts_user_tag_prefix "
+            "ON tag_counts (user_id, tag text_pattern_ops)"
+        ))
+        # Nearly always empty; lets the trigger's cleanup skip a full scan
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_tag_counts_empty "
+            "ON tag_counts (user_id) WHERE count <= 0"
+        ))
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION tag_counts_apply() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO tag_counts (user_id, tag, count)
+                    SELECT user_id, tag, count(*)
+                    FROM new_rows, unnest(tags) AS tag
+                    GROUP BY user_id, tag
+                    ON CONFLICT (user_id, tag) DO UPDATE
+                        SET count = tag_counts.count + EXCLUDED.count;
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE tag_counts t SET count = t.count - d.n
+                    FROM (
+                        SELECT user_id, tag, count(*) AS n
+                        FROM old_rows, unnest(tags) AS tag
+                        GROUP BY user_id, tag
+                    ) d
+                    WHERE t.user_id = d.user_id AND t.tag = d.tag;
+                ELSE
+                    INSERT INTO tag_counts (user_id, tag, count)
+                    SELECT user_id, tag, sum(n) FROM (
+                        SELECT user_id, tag, 1 AS n
+                        FROM new_rows, unnest(tags) AS tag
+                        UNION ALL
+                        SELECT user_id, tag, -1
+                        FROM old_rows, unnest(tags) AS tag
+                    ) d
+                    GROUP BY user_id, tag
+                    HAVING sum(n) <> 0
+                    ON CONFLICT (user_id, tag) DO UPDATE
+                        SET count = tag_counts.count + EXCLUDED.count;
+                END IF;
+                DELETE FROM tag_counts WHERE count <= 0;
+                RETURN NULL;
+            END $$
+        """))
+        await conn.execute(text("""
+            CREATE OR REPLACE TRIGGER tag_counts_insert
+            AFTER INSERT ON bookmarks REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION tag_counts_apply()
+        """))
+        await conn.execute(text("""
+            CREATE OR REPLACE TRIGGER tag_counts_update
+            AFTER UPDATE ON bookmarks
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION tag_counts_apply()
+        """))
+        await conn.execute(text("""
+            CREATE OR REPLACE TRIGGER tag_counts_delete
+            AFTER DELETE ON bookmarks REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION tag_counts_apply()
+        """))
+        if seed_tag_counts:
+            await conn.execute(text(TAG_COUNTS))
         await conn.execute(text("""
             CREATE TABLE IF NOT EXISTS bookmark_embeddings (
                 id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                 bookmark_id UUID REFERENCES bookmarks(id) ON DELETE CASCADE,
                 chunk_index INTEGER NOT NULL,
                 chunk_text TEXT NOT NULL,
+                chunk_hash TEXT,
                 embedding VECTOR(384)
             )
         """))
+        await conn.execute(text(
+            "ALTER TABLE bookmark_embeddings ADD COLUMN IF NOT EXISTS chunk_hash TEXT"
+        ))
         await conn.execute(text(
             "CREATE INDEX IF NOT EXISTS embedding_idx "
-            "ON bookmark_embeddings USING hnsw (embedding vector_cosine_ops)"
+            "ON bookmark_embeddings USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {settings.HNSW_M}, "
+            f"ef_construction = {settings.HNSW_EF_CONSTRUCTION})"
         ))
         await conn.execute(text(
             "CREATE INDEX IF NOT EXISTS idx_bookmark_embeddings_bookmark_id "
             "ON bookmark_embeddings(bookmark_id)"
         ))
+        # Denormalized owner so vector scans can filter by tenant directly
+        await conn.execute(text(
+            "ALTER TABLE bookmark_embeddings ADD COLUMN IF NOT EXISTS user_id TEXT"
+        ))
         await conn.execute(text(f"""
             CREATE TABLE IF NOT EXISTS bookmark_embeddings_openai (
                 id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                 bookmark_id UUID REFERENCES bookmarks(id) ON DELETE CASCADE,
                 chunk_index INTEGER NOT NULL,
                 chunk_text TEXT NOT NULL,
+                chunk_hash TEXT,
                 embedding VECTOR({openai_dim})
             )
         """))
+        await conn.execute(text(
+            "ALTER TABLE bookmark_embeddings_openai "
+            "ADD COLUMN IF NOT EXISTS chunk_hash TEXT"
+        ))
         await conn.execute(text(
             "CREATE INDEX IF NOT EXISTS idx_bookmark_embeddings_openai_bookmark_id "
             "ON bookmark_embeddings_openai(bookmark_id)"
         ))
+        await conn.execute(text(
+            "ALTER TABLE bookmark_embeddings_openai "
+            "ADD COLUMN IF NOT EXISTS user_id TEXT"
+        ))
+        # Same for the chunk owner: NOT NULL and its index are set here only
+        # while a table is empty, otherwise by migrate_owner.py in batches
+        for table in CHUNK_TABLES:
+            if not await ensure_owner(conn, table):
+                print(
+                    f"Warning: {table}.user_id is not backfilled; run "
+                    "migrate_owner.py, chunks without an owner are not searched."
+                )
+        # Full-text columns are only added here while a table is empty; on
+        # populated tables the rewrite is an explicit step (migrate_fts.py)
+        fts_tables = [t for t in FTS_COLUMNS if await ensure_fts(conn, t)]
+        configure_fts(fts_tables)
+        for table in FTS_COLUMNS:
+            if table not in fts_tables:
+                print(
+                    f"Warning: {table} has no full-text column; run "
+                    "migrate_fts.py to enable lexical search on it."
+                )
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                namespace TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                embedding BYTEA NOT NULL,
+                last_used_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (namespace, text_hash)
+            )
+        """))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS embedding_cache_last_used_idx "
+            "ON embedding_cache (last_used_at)"
+        ))
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS reembed_jobs (
+                id UUID PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                total INTEGER,
+                processed INTEGER NOT NULL DEFAULT 0,
+                checkpoint_id UUID,
+                cancel_requested BOOLEAN NOT NULL DEFAULT false,
+                error TEXT,
+                owner TEXT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                started_at TIMESTAMPTZ,
+                heartbeat_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ,
+                run_started_at TIMESTAMPTZ,
+                run_start_processed INTEGER NOT NULL DEFAULT 0
+            )
+        """))
+        # One active job per user and target table, so a user's own re-embed
+        # and a provider-migration backfill can run side by side
+        await conn.execute(text("DROP INDEX IF EXISTS reembed_jobs_active_user_idx"))
+        await conn.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS reembed_jobs_active_idx
+                ON reembed_jobs (user_id, provider)
+                WHERE status IN ('pending', 'running')
+        """))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS reembed_jobs_user_created_idx "
+            "ON reembed_jobs (user_id, created_at DESC)"
+        ))
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                bookmark_id UUID PRIMARY KEY
+                    REFERENCES bookmarks(id) ON DELETE CASCADE,
+                status TEXT NOT NULL DEFAULT 'queued',
+                rerun BOOLEAN NOT NULL DEFAULT false,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                owner TEXT,
+                available_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                claimed_at TIMESTAMPTZ,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """))
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ingest_jobs_pending_idx
+                ON ingest_jobs (available_at)
+                WHERE status IN ('queued', 'processing')
+        """))
         await conn.execute(text("""
             CREATE TABLE IF NOT EXISTS allowed_users (
                 email TEXT PRIMARY KEY,
@@ -201,15 +482,24 @@ async def lifespan(app: FastAPI):
         async with engine.begin() as conn:
             await conn.execute(text(
                 "CREATE INDEX IF NOT EXISTS embedding_openai_idx "
-                "ON bookmark_embeddings_openai USING hnsw (embedding vector_cosine_ops)"
+                "ON bookmark_embeddings_openai "
+                "USING hnsw (embedding vector_cosine_ops) "
+                f"WITH (m = {settings.HNSW_M}, "
+                f"ef_construction = {settings.HNSW_EF_CONSTRUCTION})"
             ))
     except Exception as e:
         print(
             "Warning: Could not create HNSW index for OpenAI embeddings: "
             f"{e}. Falling back to linear scan."
         )
+    reembed_runner.start()
+    ingest_queue.start()
+    memory_governor.start()
     yield
     # Shutdown
+    await memory_governor.stop()
+    await ingest_queue.stop()
+    await reembed_runner.stop()
     await app.state.http.aclose()
     await engine.dispose()
 
@@ -265,6 +555,18 @@ async def get_current_user(
 
 
 
+async def require_metrics_access(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> None:
+    if settings.METRICS_TOKEN:
+        if not hmac.compare_digest(
+            credentials.credentials.encode(), settings.METRICS_TOKEN.encode()
+        ):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+        return
+    await get_current_user(credentials)
+
+
 # --- Endpoints ---
 
 @app.get("/")
@@ -272,6 +574,14 @@ async def root():
     return {"message": "Smart Bookmark Manager API is running"}
 
 
+@app.get("/metrics")
+@limiter.limit("60/minute")
+async def get_metrics(
+    request: Request, _: None = Depends(require_metrics_access)
+):
+    return metrics.snapshot()
+
+
 @app.post("/auth/google")
 @limiter.limit("5/minute")
 async def auth_google(
@@ -487,7 +797,7 @@ async def ingest_bookmark(
     user_id: str = Depends(get_current_user)
 ):
     try:
-        bookmark = await ingestion_service.process_bookmark(
+        bookmark = await ingest_queue.submit(
             session,
             user_id,
             payload.url,
@@ -500,7 +810,7 @@ async def ingest_bookmark(
             url=bookmark.url,
             title=bookmark.title,
             tags=bookmark.tags,
-            status="ingested",
+            status="queued",
             created_at=bookmark.created_at,
             updated_at=bookmark.updated_at,
             content_markdown=bookmark.content_markdown
@@ -508,6 +818,140 @@ async def ingest_bookmark(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _ingest_window(
+    session: AsyncSession, user_id: str, bookmarks: List[BookmarkIngestRequest]
+) -> List[dict]:
+    items = [
+        {
+            "url": b.url,
+            "title": b.title,
+            "content": b.content_markdown,
+            "tags": b.tags,
+        }
+        for b in bookmarks
+    ]
+    try:
+        return await ingestion_service.process_batch(session, user_id, items)
+    except (IntegrityError, DataError) as e:
+        await session.rollback()
+        if len(bookmarks) == 1:
+            return [_failed(bookmarks[0], e)]
+    except Exception as e:
+        # Provider or connection trouble: splitting would only repeat it
+        await session.rollback()
+        return [_failed(b, e) for b in bookmarks]
+    # The window shares one transaction, so one bad row fails all of it:
+    # retry in halves until each failure is pinned to its own item (with the
+    # embedding cache on, the good items' vectors are not computed again)
+    mid = len(bookmarks) // 2
+    return (
+        await _ingest_window(session, user_id, bookmarks[:mid])
+        + await _ingest_window(session, user_id, bookmarks[mid:])
+    )
+
+
+def _failed(bookmark: BookmarkIngestRequest, error: Exception) -> dict:
+    return {"url": bookmark.url, "id": None, "status": "failed", "error": str(error)}
+
+def _docs_per_second(count: int, elapsed: float) -> float:
+    return round(count / elapsed, 2) if elapsed > 0 else 0.0
+
+@app.post("/bookmarks/batch", response_model=BatchIngestResponse)
+@limiter.limit("10/minute")
+async def ingest_bookmarks_batch(
+    request: Request,
+    payload: BookmarkBatchIngestRequest,
+    session: AsyncSession = Depends(get_session),
+    user_id: str = Depends(get_current_user)
+):
+    started = time.perf_counter()
+    results = await _ingest_window(session, user_id, payload.bookmarks)
+    elapsed = time.perf_counter() - started
+    succeeded = sum(1 for r in results if r["status"] == "ingested")
+    return BatchIngestResponse(
+        items=[BatchItemResult(index=i, **r) for i, r in enumerate(results)],
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        elapsed_seconds=round(elapsed, 3),
+        docs_per_second=_docs_per_second(succeeded, elapsed),
+    )
+
+@app.post("/bookmarks/batch/stream")
+@limiter.limit("10/minute")
+async def ingest_bookmarks_stream(
+    request: Request,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Streaming NDJSON import: one BookmarkIngestRequest object per request
+    line, with no item cap but a body of at most INGEST_STREAM_MAX_MB
+    (413 beyond that). Bookmarks are committed in windows of
+    INGEST_STREAM_WINDOW and one BatchItemResult line (index = input line
+    number) is emitted per bookmark as soon as its window is done, followed by
+    a final summary line.
+    """
+    # The body must be drained before the response starts: once streaming,
+    # Starlette's disconnect listener consumes any further request messages.
+    max_bytes = settings.INGEST_STREAM_MAX_MB * 1024 * 1024
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Request body exceeds {settings.INGEST_STREAM_MAX_MB} MB",
+    )
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise too_large
+    lines = body.decode("utf-8").splitlines()
+    del body
+
+    async def _run() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        counts = {"ingested": 0, "failed": 0}
+        indexes: List[int] = []
+        window: List[BookmarkIngestRequest] = []
+
+        def _emit(results: List[dict], line_indexes: List[int]) -> str:
+            for r in results:
+                counts[r["status"]] += 1
+            return "".join(
+                BatchItemResult(index=i, **r).model_dump_json() + "\n"
+                for i, r in zip(line_indexes, results)
+            )
+
+        async def _flush() -> str:
+            async with AsyncSessionLocal() as session:
+                results = await _ingest_window(session, user_id, window)
+            return _emit(results, indexes)
+
+        for i, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                window.append(BookmarkIngestRequest.model_validate_json(line))
+                indexes.append(i)
+            except ValidationError as e:
+                yield _emit([{"status": "failed", "error": str(e)}], [i])
+                continue
+            if len(window) >= settings.INGEST_STREAM_WINDOW:
+                yield await _flush()
+                window, indexes = [], []
+        if window:
+            yield await _flush()
+
+        elapsed = time.perf_counter() - started
+        yield json.dumps({
+            "summary": True,
+            "succeeded": counts["ingested"],
+            "failed": counts["failed"],
+            "elapsed_seconds": round(elapsed, 3),
+            "docs_per_second": _docs_per_second(counts["ingested"], elapsed),
+        }) + "\n"
+
+    return StreamingResponse(_run(), media_type="application/x-ndjson")
+
 @app.post("/search", response_model=List[SearchResult])
 @limiter.limit("60/minute")
 async def search_bookmarks(
@@ -517,19 +961,23 @@ async def search_bookmarks(
     user_id: str = Depends(get_current_user)
 ):
     try:
-        # returns list of (BookmarkEmbedding, Bookmark, distance) tuples
+        # returns one (bookmark_id, url, title, chunk_text, distance, ...) row
+        # per bookmark
         results = await search_service.search(
-            session, user_id, payload.query, payload.limit
+            session, user_id, payload.query, payload.limit,
+            ef_search=payload.ef_search,
+            candidate_multiplier=payload.candidate_multiplier,
+            exact=payload.exact,
         )
         
         response_list = []
-        for embedding_entry, bookmark, distance in results:
+        for hit in results:
             response_list.append(SearchResult(
-                id=str(bookmark.id),
-                url=bookmark.url,
-                title=bookmark.title,
-                score=distance, 
-                text=embedding_entry.chunk_text
+                id=str(hit.bookmark_id),
+                url=hit.url,
+                title=hit.title,
+                score=hit.distance, 
+                text=hit.chunk_text
             ))
             
         return response_list
@@ -551,6 +999,35 @@ async def chat_bookmarks(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+@limiter.limit("20/minute")
+async def chat_bookmarks_stream(
+    request: Request,
+    payload: ChatRequest,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Server-sent events version of /chat. Emits one `sources` event (list of
+    URLs) once retrieval is done, `token` events carrying answer text as the
+    LLM generates it, then `done`. A generation failure is sent as an `error`
+    event, since the HTTP status has already gone out by then.
+    """
+    async def _events() -> AsyncIterator[str]:
+        try:
+            async for event, data in search_service.chat_stream(
+                user_id, payload.query
+            ):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/recent", response_model=List[BookmarkResponse])
 async def get_recent_bookmarks(
     limit: int = 10,
@@ -593,12 +1070,13 @@ async def get_bookmarks(
     limit: int = 50,
     tag_prefix: Optional[str] = None,
     query: Optional[str] = None,
+    cursor: Optional[str] = None,
     session: AsyncSession = Depends(get_session),
     user_id: str = Depends(get_current_user)
 ):
     try:
-        bookmarks, total = await management_service.get_bookmarks(
-            session, user_id, skip, limit, tag_prefix, query
+        bookmarks, total, next_cursor = await management_service.get_bookmarks(
+            session, user_id, skip, limit, tag_prefix, query, cursor
         )
         items = [
             BookmarkResponse(
@@ -612,11 +1090,47 @@ async def get_bookmarks(
             ) for b in bookmarks
         ]
         return PaginatedBookmarksResponse(
-            items=items, total=total, skip=skip, limit=limit
+            items=items, total=total, skip=skip, limit=limit,
+            next_cursor=next_cursor,
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/bookmarks/{bookmark_id}/content", response_model=BookmarkContentResponse)
+@limiter.limit("60/minute")
+async def get_bookmark_content(
+    request: Request,
+    bookmark_id: str,
+    session: AsyncSession = Depends(get_session),
+    user_id: str = Depends(get_current_user)
+):
+    try:
+        found = await management_service.get_content(session, user_id, bookmark_id)
+        if not found:
+            raise HTTPException(status_code=404, detail="Bookmark not found")
+        return BookmarkContentResponse(id=str(found[0]), content_markdown=found[1])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/bookmarks/{bookmark_id}/status")
+@limiter.limit("60/minute")
+async def get_bookmark_status(
+    request: Request,
+    bookmark_id: str,
+    user_id: str = Depends(get_current_user)
+):
+    try:
+        found = await ingest_queue.status(user_id, UUID(bookmark_id))
+    except ValueError:
+        found = None
+    if not found:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+    return found
+
 @app.patch("/bookmarks/{bookmark_id}", response_model=BookmarkResponse)
 @limiter.limit("60/minute")
 async def update_bookmark(
@@ -639,8 +1153,7 @@ async def update_bookmark(
             tags=bookmark.tags,
             status="updated",
             created_at=bookmark.created_at,
-            updated_at=bookmark.updated_at,
-            content_markdown=bookmark.content_markdown
+            updated_at=bookmark.updated_at
         )
     except HTTPException:
         raise
@@ -735,11 +1248,19 @@ async def bulk_remove_tag(
 @limiter.limit("5/minute")
 async def start_reembed(
     request: Request,
-    background_tasks: BackgroundTasks,
     user_id: str = Depends(get_current_user)
 ):
-    background_tasks.add_task(management_service.reembed_user_bookmarks, user_id)
-    return {"status": "started"}
+    return await reembed_runner.enqueue(user_id)
+
+@app.post("/bookmarks/reembed/cancel")
+@limiter.limit("10/minute")
+async def cancel_reembed(
+    request: Request,
+    user_id: str = Depends(get_current_user)
+):
+    if not await reembed_runner.cancel(user_id):
+        raise HTTPException(status_code=404, detail="No active re-embed job")
+    return {"status": "cancelling"}
 
 @app.get("/bookmarks/reembed/status")
 @limiter.limit("60/minute")
@@ -747,7 +1268,7 @@ async def get_reembed_status(
     request: Request,
     user_id: str = Depends(get_current_user)
 ):
-    status = management_service.reembed_jobs.get(user_id)
+    status = await reembed_runner.status(user_id)
     if not status:
         return {"status": "none"}
     return status
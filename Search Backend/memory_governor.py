@@ -0,0 +1,161 @@
+import asyncio
+import ctypes
+import gc
+import os
+import time
+from typing import Any, Optional
+import metrics
+import settings
+
+try:
+    _libc: Any = ctypes.CDLL("libc.so.6")
+except OSError:
+    _libc = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_MB = 1024 * 1024
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [
+        (name, ctypes.c_size_t)
+        for name in (
+            "arena", "ordblks", "smblks", "hblks", "hblkhd",
+            "usmblks", "fsmblks", "uordblks", "fordblks", "keepcost",
+        )
+    ]
+
+
+if _libc is not None and hasattr(_libc, "mallinfo2"):  # glibc >= 2.33
+    _libc.mallinfo2.restype = _MallInfo2
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _arenas() -> Optional[dict]:
+    if _libc is None or not hasattr(_libc, "mallinfo2"):
+        return None
+    info = _libc.mallinfo2()
+    return {
+        "heap_mb": round(info.arena / _MB, 1),
+        "mmap_mb": round(info.hblkhd / _MB, 1),
+        "in_use_mb": round(info.uordblks / _MB, 1),
+        "free_mb": round(info.fordblks / _MB, 1),
+        "trimmable_mb": round(info.keepcost / _MB, 1),
+    }
+
+
+class MemoryGovernor:
+    """
+    Keeps the process under its memory cap without collecting on every
+    request. Every `check_seconds` it samples RSS: above `soft_mb` it returns
+    freed heap pages to the OS with malloc_trim, run in a thread since
+    ctypes releases the GIL; above `hard_mb` it first runs a full
+    gc.collect(), at most once per `cooldown_seconds`. A watermark of 0
+    disables that action.
+
+    The collection stays on the event loop on purpose: the collector holds
+    the GIL for the whole pass, so a worker thread would stall the loop just
+    the same, and it would run finalizers (asyncpg connections, transports)
+    off the loop thread. Instead `start` freezes everything allocated during
+    startup (modules, models, pools) into the permanent generation, so a
+    full collection only traverses objects created while serving.
+
+    Also times every garbage collection, including the interpreter's own,
+    as gc_pause_seconds.gen<N>.
+    """
+
+    def __init__(
+        self,
+        soft_mb: int,
+        hard_mb: int,
+        check_seconds: float,
+        cooldown_seconds: float,
+    ):
+        self.soft_bytes = soft_mb * _MB
+        self.hard_bytes = hard_mb * _MB
+        self.check_seconds = check_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.trims = 0
+        self.collections = 0
+        self._last_collect = float("-inf")
+        self._gc_started = 0.0
+        self._task: Optional[asyncio.Task] = None
+        metrics.register_gauge("memory", self.stats)
+
+    def start(self) -> None:
+        gc.collect()
+        gc.freeze()
+        gc.callbacks.append(self._on_gc)
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        gc.unfreeze()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _on_gc(self, phase: str, info: dict) -> None:
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        else:
+            metrics.observe(
+                f"gc_pause_seconds.gen{info['generation']}",
+                time.perf_counter() - self._gc_started,
+            )
+
+    def stats(self) -> dict:
+        rss = rss_bytes()
+        return {
+            "rss_mb": round(rss / _MB, 1) if rss is not None else None,
+            "soft_limit_mb": self.soft_bytes // _MB,
+            "hard_limit_mb": self.hard_bytes // _MB,
+            "trims": self.trims,
+            "collections": self.collections,
+            "gc_counts": gc.get_count(),
+            "gc_frozen": gc.get_freeze_count(),
+            "arenas": _arenas(),
+        }
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_seconds)
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"Warning: memory check failed: {e}")
+
+    async def check(self) -> None:
+        rss = rss_bytes()
+        if rss is None:
+            return
+        if (
+            self.hard_bytes
+            and rss > self.hard_bytes
+            and time.monotonic() - self._last_collect >= self.cooldown_seconds
+        ):
+            self._last_collect = time.monotonic()
+            self.collections += 1
+            gc.collect()
+        elif not self.soft_bytes or rss <= self.soft_bytes:
+            return
+        if _libc is not None:
+            self.trims += 1
+            await asyncio.to_thread(_libc.malloc_trim, 0)
+
+
+memory_governor = MemoryGovernor(
+    settings.MEMORY_SOFT_LIMIT_MB,
+    settings.MEMORY_HARD_LIMIT_MB,
+    settings.MEMORY_CHECK_SECONDS,
+    settings.MEMORY_COLLECT_COOLDOWN_SECONDS,
+)
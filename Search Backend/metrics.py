@@ -0,0 +1,59 @@
+from collections import defaultdict, deque
+from typing import Callable
+
+
+class _Timing:
+    def __init__(self, window: int = 512):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def snapshot(self) -> dict:
+        recent = sorted(self.recent)
+
+        def _pct(p: float) -> float:
+            return round(recent[int(p * (len(recent) - 1))], 4) if recent else 0.0
+
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": _pct(0.5),
+            "p95": _pct(0.95),
+            "max": round(self.max, 4),
+        }
+
+
+_counters: defaultdict[str, int] = defaultdict(int)
+_timings: dict[str, _Timing] = {}
+_gauges: dict[str, Callable[[], dict]] = {}
+
+
+def incr(name: str, amount: int = 1) -> None:
+    _counters[name] += amount
+
+
+def observe(name: str, seconds: float) -> None:
+    timing = _timings.get(name)
+    if timing is None:
+        timing = _timings[name] = _Timing()
+    timing.observe(seconds)
+
+
+def register_gauge(name: str, fn: Callable[[], dict]) -> None:
+    """Registers a callback whose dict is sampled on every snapshot."""
+    _gauges[name] = fn
+
+
+def snapshot() -> dict:
+    return {
+        "counters": dict(_counters),
+        "timings": {name: t.snapshot() for name, t in _timings.items()},
+        **{name: fn() for name, fn in _gauges.items()},
+    }
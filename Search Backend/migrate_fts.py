@@ -0,0 +1,103 @@
+"""
+Adds the generated tsvector columns behind full-text search (bookmarks.search_tsv
+and chunk_tsv on both embedding tables) to tables that already hold data.
+
+A STORED generated column is materialized in every row, so adding one rewrites
+the whole table and rebuilds all of its indexes, the HNSW index included, under
+an ACCESS EXCLUSIVE lock: reads and writes on that table wait until it is done.
+On boot the app only adds the columns to empty tables; existing deployments run
+this in a maintenance window and restart the app, which turns lexical ranking
+and the indexed query= filter on for the migrated tables. GIN indexes are then
+built CONCURRENTLY.
+
+    python migrate_fts.py [--table bookmark_embeddings ...]
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from database import engine
+
+FTS_COLUMNS = {
+    # Title (stemmed) and url words, weighted A/B
+    "bookmarks": ("search_tsv", """
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector(
+            'simple', regexp_replace(url, '[^[:alnum:]]+', ' ', 'g')
+        ), 'B')
+    """),
+    "bookmark_embeddings": ("chunk_tsv", "to_tsvector('english', chunk_text)"),
+    "bookmark_embeddings_openai": (
+        "chunk_tsv", "to_tsvector('english', chunk_text)"
+    ),
+}
+
+
+def _add_column(table: str) -> str:
+    column, expression = FTS_COLUMNS[table]
+    return (
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} tsvector "
+        f"GENERATED ALWAYS AS ({expression}) STORED"
+    )
+
+
+def _create_index(table: str, concurrently: bool = False) -> str:
+    column, _ = FTS_COLUMNS[table]
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+        f"idx_{table}_{column} ON {table} USING gin ({column})"
+    )
+
+
+async def has_column(conn: AsyncConnection, table: str) -> bool:
+    return bool(await conn.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :table "
+        "AND column_name = :column)"
+    ), {"table": table, "column": FTS_COLUMNS[table][0]}))
+
+
+async def ensure_fts(conn: AsyncConnection, table: str) -> bool:
+    """
+    Boot-time half: adds the column and its index while `table` is still
+    empty, where the rewrite is free. Returns whether the column exists;
+    populated tables without it are left to `main`.
+    """
+    if await has_column(conn, table):
+        return True
+    if await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {table})")):
+        return False
+    await conn.execute(text(_add_column(table)))
+    await conn.execute(text(_create_index(table)))
+    return True
+
+
+async def main(tables: List[str]) -> None:
+    for table in tables:
+        column, _ = FTS_COLUMNS[table]
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            if await has_column(conn, table):
+                print(f"{table}.{column} already present")
+            else:
+                print(f"{table}: adding {column}, rewriting the table...")
+                await conn.execute(text(_add_column(table)))
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(_create_index(table, concurrently=True)))
+        print(f"{table}: done in {time.perf_counter() - started:.1f}s")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--table", action="append", choices=list(FTS_COLUMNS),
+        help="table to migrate, repeatable (default: all)",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.table or list(FTS_COLUMNS)))
@@ -0,0 +1,129 @@
+"""
+Backfills the denormalized user_id on chunk tables created before it existed,
+then makes it NOT NULL and indexes it.
+
+Rows are updated in id order, --batch-size at a time, each batch in its own
+transaction, so no lock is held for long and the job can be stopped and rerun.
+NOT NULL goes through a NOT VALID check constraint that is validated without
+blocking writes; SET NOT NULL then reuses it instead of scanning the table
+under ACCESS EXCLUSIVE. On boot the app only does this for empty tables;
+until a populated table is migrated, its chunks without an owner are not
+found by search.
+
+    python migrate_owner.py [--table bookmark_embeddings ...] [--batch-size 5000]
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from database import engine
+
+CHUNK_TABLES = ("bookmark_embeddings", "bookmark_embeddings_openai")
+
+
+def _create_index(table: str, concurrently: bool = False) -> str:
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+        f"idx_{table}_user_id ON {table} (user_id)"
+    )
+
+
+async def is_nullable(conn: AsyncConnection, table: str) -> bool:
+    return bool(await conn.scalar(text(
+        "SELECT is_nullable = 'YES' FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :table "
+        "AND column_name = 'user_id'"
+    ), {"table": table}))
+
+
+async def ensure_owner(conn: AsyncConnection, table: str) -> bool:
+    """
+    Boot-time half: sets NOT NULL and the index while `table` is still empty.
+    Returns whether user_id is NOT NULL; populated tables are left to `main`.
+    """
+    if not await is_nullable(conn, table):
+        return True
+    if await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {table})")):
+        return False
+    await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN user_id SET NOT NULL"))
+    await conn.execute(text(_create_index(table)))
+    return True
+
+
+async def _backfill(table: str, batch_size: int) -> int:
+    updated = 0
+    after = UUID(int=0)
+    while True:
+        async with engine.begin() as conn:
+            ids = (await conn.execute(text(
+                f"SELECT id FROM {table} WHERE id > :after ORDER BY id LIMIT :n"
+            ), {"after": after, "n": batch_size})).scalars().all()
+            if not ids:
+                return updated
+            result = await conn.execute(text(f"""
+                UPDATE {table} e SET user_id = b.user_id
+                FROM bookmarks b
+                WHERE e.id = ANY(:ids) AND e.bookmark_id = b.id
+                    AND e.user_id IS NULL
+            """), {"ids": list(ids)})
+        updated += result.rowcount
+        after = ids[-1]
+
+
+async def main(tables: List[str], batch_size: int) -> None:
+    for table in tables:
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            nullable = await is_nullable(conn, table)
+        if nullable:
+            print(f"{table}: backfilling user_id...")
+            updated = await _backfill(table, batch_size)
+            constraint = f"{table}_user_id_not_null"
+            async with engine.begin() as conn:
+                # Chunks whose bookmark_id was never set have no owner to copy
+                await conn.execute(text(
+                    f"DELETE FROM {table} WHERE bookmark_id IS NULL"
+                ))
+                # IF EXISTS: left behind by an interrupted earlier run
+                await conn.execute(text(
+                    f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}"
+                ))
+                await conn.execute(text(
+                    f"ALTER TABLE {table} ADD CONSTRAINT {constraint} "
+                    "CHECK (user_id IS NOT NULL) NOT VALID"
+                ))
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}"
+                ))
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    f"ALTER TABLE {table} ALTER COLUMN user_id SET NOT NULL"
+                ))
+                await conn.execute(text(
+                    f"ALTER TABLE {table} DROP CONSTRAINT {constraint}"
+                ))
+            print(f"{table}: {updated} row(s) backfilled")
+        else:
+            print(f"{table}.user_id already NOT NULL")
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(_create_index(table, concurrently=True)))
+        print(f"{table}: done in {time.perf_counter() - started:.1f}s")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--table", action="append", choices=CHUNK_TABLES,
+        help="table to migrate, repeatable (default: both)",
+    )
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.table or list(CHUNK_TABLES), args.batch_size))
@@ -21,6 +21,8 @@ class Bookmark(SQLModel, table=True):
     url: str = Field(index=True)
     title: Optional[str] = None
     content_markdown: Optional[str] = None
+    # sha256 of content_markdown as of the last time its chunks were embedded
+    content_hash: Optional[str] = None
     tags: List[str] = Field(default=[], sa_column=Column(ARRAY(VARCHAR)))
     created_at: Optional[datetime] = Field(
         default=None,
@@ -46,8 +48,11 @@ class BookmarkEmbedding(SQLModel, table=True):
     
     id: Optional[UUID] = Field(default_factory=uuid4, primary_key=True)
     bookmark_id: UUID = Field(foreign_key="bookmarks.id")
+    # Copy of bookmarks.user_id so tenant filters apply inside the vector scan
+    user_id: str
     chunk_index: int
     chunk_text: str
+    chunk_hash: Optional[str] = None
     embedding: List[float] = Field(
         sa_column=Column(Vector(384))
     )  # Dimension for all-MiniLM-L6-v2
@@ -60,8 +65,11 @@ class BookmarkEmbeddingOpenAI(SQLModel, table=True):
     
     id: Optional[UUID] = Field(default_factory=uuid4, primary_key=True)
     bookmark_id: UUID = Field(foreign_key="bookmarks.id")
+    # Copy of bookmarks.user_id so tenant filters apply inside the vector scan
+    user_id: str
     chunk_index: int
     chunk_text: str
+    chunk_hash: Optional[str] = None
     embedding: List[float] = Field(sa_column=Column(Vector(openai_dim)))
     
     # Relationship
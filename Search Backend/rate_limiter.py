@@ -0,0 +1,126 @@
+import asyncio
+import re
+import time
+from typing import List, Mapping, Optional
+from tokenizer import count_tokens
+
+
+def batch_by_tokens(
+    texts: List[str], max_tokens: int, max_items: int
+) -> List[tuple[int, int, int]]:
+    """
+    Splits `texts` into consecutive (start, end, tokens) ranges holding at
+    most `max_items` texts and `max_tokens` tokens each. A single text larger
+    than `max_tokens` still gets a range of its own.
+    """
+    batches = []
+    start = tokens = 0
+    for i, t in enumerate(texts):
+        n = count_tokens(t)
+        if i > start and (tokens + n > max_tokens or i - start >= max_items):
+            batches.append((start, i, tokens))
+            start, tokens = i, 0
+        tokens += n
+    if start < len(texts):
+        batches.append((start, len(texts), tokens))
+    return batches
+
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    # OpenAI reset headers look like "20ms", "1s" or "6m0s"
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_SECONDS[unit] for n, unit in parts)
+
+
+class _Bucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        # A request bigger than the whole bucket is let through once it is full
+        needed = min(amount, self.capacity) - self.level
+        return needed / self.rate if needed > 0 else 0.0
+
+
+class RateLimiter:
+    """
+    Client-side token buckets for an API with requests-per-minute and
+    tokens-per-minute quotas. `acquire` waits (FIFO) until both buckets can
+    pay for a call; `observe` re-syncs the buckets from the server's
+    `x-ratelimit-*` response headers, so limits configured too high or too
+    low converge on the account's real quota after the first response.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.waited = 0.0
+        self.throttled = 0
+        self._lock = asyncio.Lock()
+
+    def stats(self) -> dict:
+        return {
+            "rpm": self.requests.capacity,
+            "tpm": self.tokens.capacity,
+            "requests_available": int(self.requests.level),
+            "tokens_available": int(self.tokens.level),
+            "throttled": self.throttled,
+            "waited_seconds": round(self.waited, 3),
+        }
+
+    async def acquire(self, tokens: int) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                delay = max(self.requests.wait_for(1), self.tokens.wait_for(tokens))
+                if delay <= 0:
+                    break
+                self.waited += delay
+                await asyncio.sleep(delay)
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            if limit:
+                try:
+                    bucket.capacity = float(limit)
+                    bucket.rate = bucket.capacity / 60
+                except ValueError:
+                    pass
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining:
+                try:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, float(remaining))
+                except ValueError:
+                    pass
+
+    def throttle(self, headers: Mapping[str, str]) -> None:
+        """Empties the buckets after a 429 so queued calls back off together."""
+        self.throttled += 1
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}", ""))
+            bucket.refill(now)
+            if reset:
+                bucket.level = min(bucket.level, -reset * bucket.rate)
+            else:
+                bucket.level = min(bucket.level, 0.0)
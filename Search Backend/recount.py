@@ -0,0 +1,38 @@
+"""
+Rebuilds bookmark_counts and tag_counts from the bookmarks table.
+
+Both are kept current by statement-level triggers and seeded only when boot
+creates them, so a count that has drifted (triggers disabled for a bulk
+load, rows edited by hand) stays wrong until this runs. Bookmarks are locked
+in SHARE mode for the duration: reads carry on, writes wait until it commits.
+
+    python recount.py
+"""
+import asyncio
+from sqlalchemy import text
+from database import engine
+
+BOOKMARK_COUNTS = """
+    INSERT INTO bookmark_counts (user_id, total)
+    SELECT user_id, count(*) FROM bookmarks GROUP BY user_id
+"""
+TAG_COUNTS = """
+    INSERT INTO tag_counts (user_id, tag, count)
+    SELECT user_id, tag, count(*) FROM bookmarks, unnest(tags) AS tag
+    GROUP BY user_id, tag
+"""
+
+
+async def recount() -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("LOCK TABLE bookmarks IN SHARE MODE"))
+        await conn.execute(text("DELETE FROM bookmark_counts"))
+        users = (await conn.execute(text(BOOKMARK_COUNTS))).rowcount
+        await conn.execute(text("DELETE FROM tag_counts"))
+        tags = (await conn.execute(text(TAG_COUNTS))).rowcount
+    await engine.dispose()
+    print(f"Recounted {users} user(s) and {tags} (user, tag) pair(s).")
+
+
+if __name__ == "__main__":
+    asyncio.run(recount())
@@ -1,49 +1,181 @@
+"""
+Re-embeds every bookmark in the database into the current provider's table.
+
+Streams bookmarks in id order through a bounded pipeline: one reader on a
+server-side cursor, --workers embedding workers and one COPY writer, with at
+most --queue-size batches waiting between stages, so memory stays flat
+whatever the corpus size. Each batch replaces its bookmarks' chunks in its
+own transaction, skipping bookmarks edited meanwhile; search keeps working
+throughout. Progress lines carry a checkpoint (every bookmark up to that id
+is done) to pass as --resume-from after an interruption.
+
+    python reembed.py [--workers 2] [--batch-size 32] [--resume-from UUID]
+"""
+import argparse
 import asyncio
-from sqlmodel import select, delete
-from database import get_session
+import heapq
+import resource
+import time
+from typing import Any, List, Optional
+from uuid import UUID
+from sqlalchemy import func
+from sqlmodel import col, select
+from database import AsyncSessionLocal, engine
 from models import Bookmark
-from services import get_provider, split_text
-
-async def reembed_all():
-    print("Fetching all bookmarks...")
-    # Manually get a session
-    async for session in get_session():
-        stmt = select(Bookmark)
-        result = await session.execute(stmt)
-        bookmarks = result.scalars().all()
-        
-        provider = get_provider()
-        model_cls = provider.model_class
-        
-        print(
-            f"Found {len(bookmarks)} bookmarks for provider "
-            f"'{provider.name}'. Deleting old embeddings..."
+from services import get_provider, replace_chunks, split_for
+import settings
+
+_DONE = None
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _read(
+    queue: asyncio.Queue, batch_size: int, resume_from: Optional[UUID], workers: int
+) -> None:
+    stmt = select(
+        Bookmark.id,
+        Bookmark.user_id,
+        Bookmark.content_markdown,
+        Bookmark.content_hash,
+    ).order_by(col(Bookmark.id))
+    if resume_from is not None:
+        stmt = stmt.where(col(Bookmark.id) > resume_from)
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=batch_size)
         )
-        await session.execute(delete(model_cls))
-        await session.commit()
-        
-        print("Re-embedding bookmarks...")
-        for b in bookmarks:
-            if not b.content_markdown:
-                continue
-            
-            chunks = split_text(b.content_markdown)
-            if not chunks:
-                continue
-                
-            embeddings = await provider.embed_documents(chunks)
-            for i, (text, vector) in enumerate(zip(chunks, embeddings)):
-                emb_entry = model_cls(
-                    bookmark_id=b.id,
-                    chunk_index=i,
-                    chunk_text=text,
-                    embedding=vector
-                )
-                session.add(emb_entry)
-        
-        await session.commit()
-        print("Done!")
-        break
+        seq = 0
+        async for batch in result.partitions():
+            await queue.put((seq, batch))
+            seq += 1
+    for _ in range(workers):
+        await queue.put(_DONE)
+
+
+async def _embed(provider: Any, inbox: asyncio.Queue, outbox: asyncio.Queue) -> None:
+    while (item := await inbox.get()) is not _DONE:
+        seq, batch = item
+        rows = [
+            (b.id, i, chunk)
+            for b in batch if b.content_markdown
+            for i, chunk in enumerate(split_for(provider, b.content_markdown))
+        ]
+        vectors = await provider.embed_documents([chunk for _, _, chunk in rows])
+        await outbox.put((seq, batch, rows, vectors))
+    await outbox.put(_DONE)
+
+
+async def _write(
+    provider: Any, inbox: asyncio.Queue, workers: int, total: int, progress: dict
+) -> None:
+    """
+    Writes batches as they arrive, keeping progress["checkpoint"] current.
+    Bookmarks edited or deleted since they were read are skipped (see
+    services.replace_chunks), since the service stays live meanwhile.
+    """
+    started = last_report = time.perf_counter()
+    done = chunks = 0
+    # Batches finish out of order; the checkpoint only advances over the
+    # contiguous prefix of written batches
+    written: List[tuple[int, UUID]] = []
+    next_seq = 0
+    finished = 0
+    while finished < workers:
+        item = await inbox.get()
+        if item is _DONE:
+            finished += 1
+            continue
+        seq, batch, rows, vectors = item
+        async with AsyncSessionLocal() as session:
+            copied = await replace_chunks(session, provider, batch, rows, vectors)
+            await session.commit()
+
+        done += len(batch)
+        chunks += copied
+        heapq.heappush(written, (seq, batch[-1].id))
+        while written and written[0][0] == next_seq:
+            progress["checkpoint"] = heapq.heappop(written)[1]
+            next_seq += 1
+
+        now = time.perf_counter()
+        if now - last_report >= 10:
+            last_report = now
+            print(
+                f"{done}/{total} bookmarks, {chunks} chunks, "
+                f"{done / (now - started):.1f} docs/sec, "
+                f"peak RSS {_peak_rss_mb():.0f} MB, checkpoint {progress['checkpoint']}"
+            )
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Done: {done} bookmarks, {chunks} chunks in {elapsed:.1f}s "
+        f"({done / elapsed if elapsed else 0:.1f} docs/sec), "
+        f"peak RSS {_peak_rss_mb():.0f} MB"
+    )
+
+
+async def reembed_all(
+    workers: int, batch_size: int, queue_size: int, resume_from: Optional[UUID]
+) -> None:
+    provider = get_provider()
+    async with AsyncSessionLocal() as session:
+        stmt = select(Bookmark.id)
+        if resume_from is not None:
+            stmt = stmt.where(col(Bookmark.id) > resume_from)
+        total = (await session.execute(
+            select(func.count()).select_from(stmt.subquery())
+        )).scalar_one()
+    print(
+        f"Re-embedding {total} bookmarks into '{provider.table_name}' "
+        f"({provider.name}) with {workers} workers"
+        + (f", resuming after {resume_from}" if resume_from else "")
+    )
+
+    to_embed: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    to_write: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    progress: dict[str, Optional[UUID]] = {"checkpoint": resume_from}
+    stages = [
+        asyncio.create_task(_write(provider, to_write, workers, total, progress)),
+        asyncio.create_task(_read(to_embed, batch_size, resume_from, workers)),
+        *(
+            asyncio.create_task(_embed(provider, to_embed, to_write))
+            for _ in range(workers)
+        ),
+    ]
+    try:
+        await asyncio.gather(*stages)
+    except BaseException:
+        for task in stages:
+            task.cancel()
+        if progress["checkpoint"] is not None:
+            print(
+                "Interrupted; continue with "
+                f"--resume-from {progress['checkpoint']}"
+            )
+        raise
+    finally:
+        await engine.dispose()
+
 
 if __name__ == "__main__":
-    asyncio.run(reembed_all())
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=settings.REEMBED_BATCH_SIZE)
+    parser.add_argument(
+        "--queue-size", type=int, default=None,
+        help="batches buffered between stages (default: 2 x workers)",
+    )
+    parser.add_argument("--resume-from", type=UUID, default=None)
+    args = parser.parse_args()
+    asyncio.run(reembed_all(
+        args.workers,
+        args.batch_size,
+        args.queue_size or 2 * args.workers,
+        args.resume_from,
+    ))
@@ -0,0 +1,421 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+from typing import Any, List, Optional
+from uuid import UUID, uuid4
+import numpy as np
+from sqlalchemy import func, text
+from sqlmodel import col, select
+from database import AsyncSessionLocal
+from models import Bookmark
+from services import (
+    EmbeddingProvider, get_migration_target, get_provider, provider_for_table,
+    replace_chunks, split_for,
+)
+import metrics
+import settings
+
+_JOB_COLUMNS = """
+    id, user_id, status, total, processed, error, cancel_requested,
+    created_at, started_at, heartbeat_at, finished_at,
+    EXTRACT(EPOCH FROM now() - run_started_at) AS run_seconds,
+    processed - run_start_processed AS run_processed
+"""
+
+
+class ReembedJobRunner:
+    """
+    Runs per-user re-embedding jobs recorded in the `reembed_jobs` table.
+
+    A job walks the user's bookmarks in id order, REEMBED_BATCH_SIZE at a
+    time. Up to REEMBED_CONCURRENCY batches are embedding at once, and each
+    is written (COPY) in order in its own transaction together with the job's
+    checkpoint, so a crash or redeploy loses at most the batches in flight.
+    Workers claim jobs with SKIP LOCKED and refresh a heartbeat every third
+    of REEMBED_STALE_SECONDS while the job runs; a `running` job whose
+    heartbeat is older than REEMBED_STALE_SECONDS is picked up again by the
+    next sweep of any worker and continues after its checkpoint.
+
+    Jobs target one provider's table. Users start jobs for the current
+    provider; while EMBEDDING_MIGRATE_TO is set the sweep also queues a
+    backfill job into the target's table for every user, at most
+    MIGRATION_MAX_JOBS at a time and pausing MIGRATION_BATCH_PAUSE_SECONDS
+    after each batch. A user's completed backfill is what cuts their
+    searches over (see SearchService.provider_for).
+    """
+
+    def __init__(self):
+        self.worker_id = str(uuid4())
+        self._tasks: set[asyncio.Task] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._dispatching = asyncio.Lock()
+        self._migration: dict[str, Any] = {}
+        metrics.register_gauge("embedding_migration", lambda: self._migration)
+
+    def start(self) -> None:
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self) -> None:
+        # Unfinished jobs keep status 'running' and are resumed once stale
+        tasks = [t for t in (self._sweeper, *self._tasks) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                await self._schedule_migration()
+                await self.dispatch()
+            except Exception as e:
+                print(f"Warning: re-embed sweep failed: {e}")
+            await asyncio.sleep(settings.REEMBED_POLL_SECONDS)
+
+    async def enqueue(self, user_id: str) -> dict:
+        """
+        Starts a job for `user_id`, or returns the one already active. A job
+        that failed is resumed from its checkpoint instead of restarted.
+        """
+        provider = get_provider()
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(text(f"""
+                UPDATE reembed_jobs
+                SET status = 'pending', error = NULL, finished_at = NULL
+                WHERE id = (
+                        SELECT id FROM reembed_jobs
+                    WHERE user_id = :uid AND provider = :provider
+                    ORDER BY created_at DESC LIMIT 1
+                ) AND status = 'failed' AND provider = :provider
+                RETURNING {_JOB_COLUMNS}
+            """), {"uid": user_id, "provider": provider.table_name})).first()
+            if row is None:
+                # The partial unique index allows one active job per user
+                row = (await session.execute(text(f"""
+                    INSERT INTO reembed_jobs (id, user_id, provider)
+                    VALUES (:id, :uid, :provider)
+                    ON CONFLICT (user_id, provider)
+                        WHERE status IN ('pending', 'running')
+                    DO NOTHING
+                    RETURNING {_JOB_COLUMNS}
+                """), {
+                    "id": uuid4(),
+                    "uid": user_id,
+                    "provider": provider.table_name,
+                })).first()
+            await session.commit()
+        if row is None:
+            job = await self.status(user_id)
+            assert job is not None
+            return job
+        await self.dispatch()
+        return self._describe(row)
+
+    async def cancel(self, user_id: str) -> bool:
+        """
+        Flags the user's active job for cancellation. A pending job is
+        cancelled at once; a running one stops after its current batch.
+        """
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(text("""
+                UPDATE reembed_jobs
+                SET cancel_requested = true,
+                    status = CASE WHEN status = 'pending'
+                        THEN 'cancelled' ELSE status END,
+                    finished_at = CASE WHEN status = 'pending'
+                        THEN now() ELSE finished_at END
+                WHERE user_id = :uid AND provider = :provider
+                    AND status IN ('pending', 'running')
+            """), {"uid": user_id, "provider": get_provider().table_name})
+            await session.commit()
+        return getattr(result, "rowcount", 0) > 0
+
+    async def status(self, user_id: str) -> Optional[dict]:
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(text(f"""
+                SELECT {_JOB_COLUMNS} FROM reembed_jobs
+                WHERE user_id = :uid AND provider = :provider
+                ORDER BY created_at DESC LIMIT 1
+            """), {"uid": user_id, "provider": get_provider().table_name})).first()
+        return self._describe(row) if row is not None else None
+
+    @staticmethod
+    def _describe(row: Any) -> dict:
+        rate = None
+        if row.run_seconds and row.run_processed:
+            rate = row.run_processed / float(row.run_seconds)
+        eta = None
+        if rate and row.status == "running" and row.total is not None:
+            eta = max(row.total - row.processed, 0) / rate
+        return {
+            "job_id": str(row.id),
+            "status": row.status,
+            "total": row.total or 0,
+            "processed": row.processed,
+            "error": row.error,
+            "cancel_requested": row.cancel_requested,
+            "created_at": row.created_at,
+            "started_at": row.started_at,
+            "updated_at": row.heartbeat_at,
+            "finished_at": row.finished_at,
+            "docs_per_second": round(rate, 2) if rate else None,
+            "eta_seconds": round(eta) if eta is not None else None,
+        }
+
+    async def _schedule_migration(self) -> None:
+        target = get_migration_target()
+        if target is None:
+            return
+        async with AsyncSessionLocal() as session:
+            # Failed backfills are retried from their checkpoint after a while
+            await session.execute(text("""
+                UPDATE reembed_jobs SET status = 'pending', error = NULL
+                WHERE provider = :provider AND status = 'failed'
+                    AND finished_at < now() - make_interval(secs => :retry)
+            """), {
+                "provider": target.table_name,
+                "retry": settings.MIGRATION_RETRY_SECONDS,
+            })
+            await session.execute(text("""
+                INSERT INTO reembed_jobs (id, user_id, provider)
+                SELECT gen_random_uuid(), c.user_id, :provider
+                FROM bookmark_counts c
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM reembed_jobs j
+                    WHERE j.user_id = c.user_id AND j.provider = :provider
+                        AND j.status <> 'cancelled'
+                )
+                ORDER BY c.total
+                LIMIT GREATEST(:max_jobs - (
+                    SELECT count(*) FROM reembed_jobs
+                    WHERE provider = :provider
+                        AND status IN ('pending', 'running')
+                ), 0)
+                ON CONFLICT DO NOTHING
+            """), {
+                "provider": target.table_name,
+                "max_jobs": settings.MIGRATION_MAX_JOBS,
+            })
+            counts = await session.execute(text("""
+                SELECT status, count(*) AS n FROM reembed_jobs
+                WHERE provider = :provider GROUP BY status
+            """), {"provider": target.table_name})
+            remaining = (await session.execute(text("""
+                SELECT count(*) FROM bookmark_counts c
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM reembed_jobs j
+                    WHERE j.user_id = c.user_id AND j.provider = :provider
+                        AND j.status = 'completed'
+                )
+            """), {"provider": target.table_name})).scalar_one()
+            await session.commit()
+        self._migration = {
+            "target": target.name,
+            "jobs": {row.status: row.n for row in counts.all()},
+            "users_remaining": remaining,
+        }
+
+    async def dispatch(self) -> None:
+        """Claims pending or stale jobs while this worker has free slots."""
+        async with self._dispatching:
+            while len(self._tasks) < settings.REEMBED_MAX_JOBS:
+                job = await self._claim()
+                if job is None:
+                    return
+                task = asyncio.create_task(self._run(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _claim(self) -> Optional[Any]:
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(text("""
+                UPDATE reembed_jobs
+                SET status = 'running', owner = :owner, heartbeat_at = now(),
+                    started_at = COALESCE(started_at, now()),
+                    run_started_at = now(), run_start_processed = processed
+                WHERE id = (
+                    SELECT id FROM reembed_jobs
+                    WHERE status = 'pending' OR (
+                        status = 'running'
+                        AND heartbeat_at < now() - make_interval(secs => :stale)
+                    )
+                    ORDER BY created_at
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, user_id, provider, checkpoint_id
+            """), {
+                "owner": self.worker_id,
+                "stale": settings.REEMBED_STALE_SECONDS,
+            })).first()
+            await session.commit()
+        return row
+
+    async def _run(self, job: Any) -> None:
+        provider = provider_for_table(job.provider)
+        if provider is None:
+            await self._finish(
+                job.id, "failed", f"No configured provider writes {job.provider}"
+            )
+            return
+        checkpoint: Optional[UUID] = job.checkpoint_id
+        pause = 0.0
+        if provider is get_migration_target():
+            pause = settings.MIGRATION_BATCH_PAUSE_SECONDS
+
+        async with AsyncSessionLocal() as session:
+            total = (await session.execute(
+                select(func.count()).select_from(Bookmark).where(
+                    Bookmark.user_id == job.user_id
+                )
+            )).scalar_one()
+            await session.execute(text(
+                "UPDATE reembed_jobs SET total = :total WHERE id = :id"
+            ), {"id": job.id, "total": total})
+            await session.commit()
+
+        in_flight: deque[tuple[List[Any], asyncio.Task]] = deque()
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) < settings.REEMBED_CONCURRENCY:
+                    batch = await self._next_batch(job.user_id, checkpoint)
+                    if not batch:
+                        exhausted = True
+                        break
+                    checkpoint = batch[-1].id
+                    in_flight.append((batch, asyncio.create_task(
+                        self._embed(provider, batch)
+                    )))
+                if not in_flight:
+                    break
+                batch, task = in_flight.popleft()
+                chunk_rows, vectors = await task
+                if not await self._write(
+                    job, provider, batch, chunk_rows, vectors
+                ):
+                    await self._finish(job.id, "cancelled")
+                    return
+                if pause:
+                    await asyncio.sleep(pause)
+            await self._finish(job.id, "completed")
+        except asyncio.CancelledError:
+            raise
+        except _LostJob:
+            print(f"Re-embed job {job.id} was taken over by another worker")
+        except Exception as e:
+            traceback.print_exc()
+            await self._finish(job.id, "failed", str(e))
+        finally:
+            heartbeat.cancel()
+            for _, task in in_flight:
+                task.cancel()
+
+    async def _heartbeat(self, job_id: UUID) -> None:
+        """
+        Keeps the job's heartbeat fresh while it runs, independently of
+        `_write`: a batch stuck behind a slow embed or rate limit must not
+        look stale and get claimed by a second worker.
+        """
+        while True:
+            await asyncio.sleep(settings.REEMBED_STALE_SECONDS / 3)
+            try:
+                async with AsyncSessionLocal() as session:
+                    result = await session.execute(text("""
+                        UPDATE reembed_jobs SET heartbeat_at = now()
+                        WHERE id = :id AND owner = :owner
+                    """), {"id": job_id, "owner": self.worker_id})
+                    await session.commit()
+            except Exception as e:
+                print(f"Warning: re-embed heartbeat for job {job_id} failed: {e}")
+                continue
+            if getattr(result, "rowcount", 0) == 0:
+                # Taken over; the next _write raises _LostJob
+                return
+
+    async def _next_batch(
+        self, user_id: str, after: Optional[UUID]
+    ) -> List[Any]:
+        stmt = select(
+            Bookmark.id,
+            Bookmark.user_id,
+            Bookmark.content_markdown,
+            Bookmark.content_hash,
+        ).where(Bookmark.user_id == user_id)
+        if after is not None:
+            stmt = stmt.where(col(Bookmark.id) > after)
+        stmt = stmt.order_by(col(Bookmark.id)).limit(settings.REEMBED_BATCH_SIZE)
+        async with AsyncSessionLocal() as session:
+            return list((await session.execute(stmt)).all())
+
+    async def _embed(
+        self, provider: EmbeddingProvider, batch: List[Any]
+    ) -> tuple[List[tuple[UUID, int, str]], np.ndarray]:
+        rows = [
+            (b.id, i, chunk)
+            for b in batch if b.content_markdown
+            for i, chunk in enumerate(split_for(provider, b.content_markdown))
+        ]
+        if not rows:
+            return rows, np.empty((0, provider.dimension), dtype=np.float32)
+        started = time.perf_counter()
+        vectors = await provider.embed_documents([chunk for _, _, chunk in rows])
+        metrics.observe("reembed_embed_seconds", time.perf_counter() - started)
+        return rows, vectors
+
+    async def _write(
+        self,
+        job: Any,
+        provider: EmbeddingProvider,
+        batch: List[Any],
+        rows: List[tuple[UUID, int, str]],
+        vectors: np.ndarray,
+    ) -> bool:
+        """
+        Replaces the batch's chunks and advances the checkpoint in one
+        transaction. Returns False when the job was asked to cancel.
+        """
+        async with AsyncSessionLocal() as session:
+            written = await replace_chunks(session, provider, batch, rows, vectors)
+            cancel_requested = (await session.execute(text("""
+                UPDATE reembed_jobs
+                SET processed = processed + :n, checkpoint_id = :checkpoint,
+                    heartbeat_at = now()
+                WHERE id = :id AND owner = :owner
+                RETURNING cancel_requested
+            """), {
+                "id": job.id,
+                "owner": self.worker_id,
+                "n": len(batch),
+                "checkpoint": batch[-1].id,
+            })).scalar_one_or_none()
+            if cancel_requested is None:
+                await session.rollback()
+                raise _LostJob()
+            await session.commit()
+        metrics.incr("reembed_bookmarks", len(batch))
+        metrics.incr("reembed_chunks", written)
+        return not cancel_requested
+
+    async def _finish(self, job_id: UUID, status: str, error: Optional[str] = None):
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("""
+                UPDATE reembed_jobs
+                SET status = :status, error = :error, finished_at = now(),
+                    heartbeat_at = now()
+                WHERE id = :id AND owner = :owner
+            """), {
+                "id": job_id,
+                "owner": self.worker_id,
+                "status": status,
+                "error": error,
+            })
+            await session.commit()
+
+
+class _LostJob(Exception):
+    """The job row was claimed by another worker after a missed heartbeat."""
+
+
+reembed_runner = ReembedJobRunner()
@@ -1,10 +1,20 @@
 import asyncio
+from sqlalchemy import text
 from database import engine
 from models import SQLModel
 
+# Tables created in main.lifespan rather than from the models. ingest_jobs
+# references bookmarks, so these go first; lifespan recreates them on boot.
+_LIFESPAN_TABLES = (
+    "ingest_jobs", "reembed_jobs", "embedding_cache",
+    "bookmark_counts", "tag_counts",
+)
+
 async def reset_db():
     async with engine.begin() as conn:
         # Drop all tables
+        for table in _LIFESPAN_TABLES:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
         await conn.run_sync(SQLModel.metadata.drop_all)
         # Create all tables
         await conn.run_sync(SQLModel.metadata.create_all)
@@ -1,29 +1,38 @@
-from typing import List, Protocol, Optional, Type, Any
-from sqlmodel import select, delete, col
-from sqlalchemy import func, text
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, List, Optional, Protocol, Type, cast,
+)
+from sqlmodel import select, delete, update, col
+from sqlalchemy import (
+    DateTime, Uuid, func, literal, literal_column, or_, text, tuple_,
+)
+from sqlalchemy import select as core_select
+from sqlalchemy.orm import defer
 from sqlmodel.ext.asyncio.session import AsyncSession
 from models import Bookmark, BookmarkEmbedding, BookmarkEmbeddingOpenAI
-from database import get_session
+from database import AsyncSessionLocal
+from local_engine import DOCUMENTS, QUERY, LocalEmbeddingEngine
+from rate_limiter import RateLimiter, batch_by_tokens
+from tokenizer import count_tokens, truncate_tokens
+from chunking import chunk_markdown
+from vector_writer import copy_embeddings
+from embedding_cache import (
+    CachedEmbeddingProvider, MemoryVectorLRU, PostgresVectorStore,
+)
 import asyncio
 import os
-import gc
-import ctypes
+import hashlib
+import base64
+import binascii
+import json
+import re
 from openai import AsyncOpenAI, RateLimitError, APIConnectionError
 import httpx
+import numpy as np
+import time
+from uuid import UUID, uuid4
 from datetime import datetime
-
-try:
-    _libc = ctypes.CDLL("libc.so.6")
-except OSError:
-    _libc = None
-
-def _release_memory():
-    gc.collect()
-    if _libc is not None:
-        try:
-            _libc.malloc_trim(0)
-        except Exception:
-            pass
+import settings
+import metrics
 
 _openai_client: AsyncOpenAI | None = None
 
@@ -36,15 +45,98 @@ def _get_openai_client() -> AsyncOpenAI | None:
         _openai_client = AsyncOpenAI(api_key=api_key)
     return _openai_client
 
-def split_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
-    if len(text) <= chunk_size:
-        return [text]
-    chunks, start = [], 0
-    while start < len(text):
-        end = min(start + chunk_size, len(text))
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
+def content_fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _join_overlapping(left: str, right: str) -> str:
+    # Consecutive chunks may repeat the tail of the previous one; drop the
+    # repeat. Short matches are ignored, they are as likely to be coincidence.
+    # Chunks without overlap end and start at block boundaries.
+    for size in range(min(len(left), len(right) // 2), 19, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n\n" + right
+
+def encode_cursor(created_at: datetime, bookmark_id: UUID) -> str:
+    raw = f"{created_at.isoformat()}|{bookmark_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Raises ValueError for a cursor not produced by `encode_cursor`."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, bookmark_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(bookmark_id)
+    except (UnicodeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Tables whose generated tsvector column exists (see migrate_fts.py)
+_fts_tables: set[str] = set()
+
+def configure_fts(tables: List[str]) -> None:
+    """Records, at startup, which tables full-text queries may use."""
+    _fts_tables.clear()
+    _fts_tables.update(tables)
+
+class QueryCoalescer:
+    """
+    Micro-batches concurrent query embeddings: texts arriving within
+    `window` seconds (or until `max_batch` are pending) share one call to
+    `embed_many`, and each awaiting coroutine gets its own vector back.
+    """
+
+    def __init__(
+        self,
+        embed_many: Callable[[List[str]], Awaitable[List[List[float]]]],
+        window: float,
+        max_batch: int,
+    ):
+        self.embed_many = embed_many
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: set[asyncio.Task] = set()
+
+    async def embed(self, query: str) -> List[float]:
+        if self.max_batch <= 1:
+            return (await self.embed_many([query]))[0]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[tuple[str, asyncio.Future]]) -> None:
+        texts = list(dict.fromkeys(query for query, _ in batch))
+        metrics.incr("query_coalescer.batches")
+        metrics.incr("query_coalescer.queries", len(batch))
+        try:
+            vectors = dict(zip(texts, await self.embed_many(texts)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for query, future in batch:
+            if not future.done():
+                future.set_result(vectors[query])
 
 # --- Embedding Provider Abstraction ---
 class EmbeddingProvider(Protocol):
@@ -52,36 +144,51 @@ class EmbeddingProvider(Protocol):
     dimension: int         # vector size produced by this provider
     table_name: str        # pgvector table this provider's vectors live in
     threshold: float       # default cosine distance threshold for search
+    chunk_tokens: int      # chunk size budget, see chunking.chunk_markdown
+    chunk_overlap: int
     model_class: Type[Any]
 
-    async def embed_documents(self, texts: List[str]) -> List[List[float]]: ...
+    # One C-contiguous float32 matrix, a row per text, handed unchanged to
+    # vector_writer.copy_embeddings
+    async def embed_documents(self, texts: List[str]) -> np.ndarray: ...
     async def embed_query(self, text: str) -> List[float]: ...
 
 class LocalEmbeddingProvider:
     name: str = "local"
+    model_name: str = "BAAI/bge-small-en-v1.5"
     dimension: int = 384
     table_name: str = "bookmark_embeddings"
     
     def __init__(self, threshold: float = 0.4):
         self.threshold = threshold
+        self.chunk_tokens = settings.LOCAL_CHUNK_TOKENS
+        self.chunk_overlap = settings.LOCAL_CHUNK_OVERLAP
         self.model_class = BookmarkEmbedding
-        from fastembed import TextEmbedding
-        self.model = TextEmbedding("BAAI/bge-small-en-v1.5", threads=1)
-
-    def _embed_sync(self, texts: List[str]) -> List[List[float]]:
-        # fastembed yields generators, so convert to list explicitly
-        return [embedding.tolist() for embedding in self.model.embed(texts, parallel=0)]
-
-    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        # Offload blocking work to threadpool
-        result = await asyncio.to_thread(self._embed_sync, texts)
-        _release_memory()
-        return result
+        self.engine = LocalEmbeddingEngine(
+            self.model_name,
+            workers=settings.LOCAL_EMBED_WORKERS,
+            threads=settings.LOCAL_EMBED_THREADS,
+            mode=settings.LOCAL_EMBED_MODE,
+            queue_size=settings.LOCAL_EMBED_QUEUE_SIZE,
+            sub_batch=settings.LOCAL_EMBED_SUB_BATCH,
+        )
+        metrics.register_gauge("local_embedding_engine", self.engine.stats)
+        self.queries = QueryCoalescer(
+            self.embed_queries,
+            settings.QUERY_BATCH_WINDOW_MS / 1000,
+            settings.QUERY_BATCH_MAX,
+        )
+
+    async def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return await self.engine.embed(DOCUMENTS, texts)
     
+    async def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return (await self.engine.embed(QUERY, texts)).tolist()
+
     async def embed_query(self, text: str) -> List[float]:
-        def _query_embed_sync():
-            return next(iter(self.model.query_embed(text, parallel=0))).tolist()
-        return await asyncio.to_thread(_query_embed_sync)
+        return await self.queries.embed(text)
 
 class OpenAIEmbeddingProvider:
     name: str = "openai"
@@ -96,7 +203,16 @@ class OpenAIEmbeddingProvider:
         self.model_name = model_name
         self.dimension = dimension
         self.threshold = threshold
+        self.chunk_tokens = settings.OPENAI_CHUNK_TOKENS
+        self.chunk_overlap = settings.OPENAI_CHUNK_OVERLAP
         self.model_class = BookmarkEmbeddingOpenAI
+        self.limiter = RateLimiter(settings.OPENAI_EMBED_RPM, settings.OPENAI_EMBED_TPM)
+        metrics.register_gauge("openai_rate_limiter", self.limiter.stats)
+        self.queries = QueryCoalescer(
+            self.embed_queries,
+            settings.QUERY_BATCH_WINDOW_MS / 1000,
+            settings.QUERY_BATCH_MAX,
+        )
 
     async def _embed_with_retry(self, func, *args, **kwargs) -> Any:
         import random
@@ -117,64 +233,110 @@ class OpenAIEmbeddingProvider:
                 await asyncio.sleep(sleep_time)
                 delay *= 2.0
 
-    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    async def _create(self, texts: List[str], tokens: int) -> np.ndarray:
         client = _get_openai_client()
         if not client:
             raise ValueError("OpenAI client not configured (missing OPENAI_API_KEY).")
-        
-        # Batch size of 2048 is the standard maximum allowed input array length
-        # for OpenAI embeddings
-        batch_size = 2048
-        results = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            async def _call(b=batch):
-                response = await client.embeddings.create(
-                    input=b,
+
+        async def _call():
+            await self.limiter.acquire(tokens)
+            try:
+                raw = await client.embeddings.with_raw_response.create(
+                    input=texts,
                     model=self.model_name,
-                    dimensions=self.dimension
+                    dimensions=self.dimension,
+                    encoding_format="base64",
                 )
-                return [data.embedding for data in response.data]
-            
-            batch_embeddings = await self._embed_with_retry(_call)
-            results.extend(batch_embeddings)
-            
-        return results
+            except RateLimitError as e:
+                self.limiter.throttle(e.response.headers)
+                raise
+            self.limiter.observe(raw.headers)
+            # Explicit base64 leaves each embedding as the raw little-endian
+            # float32 bytes; decode them straight into one matrix
+            data = sorted(raw.parse().data, key=lambda d: d.index)
+            blob = b"".join(base64.b64decode(cast(str, d.embedding)) for d in data)
+            return np.frombuffer(blob, dtype="<f4").reshape(len(data), -1)
 
-    async def embed_query(self, text: str) -> List[float]:
-        client = _get_openai_client()
-        if not client:
-            raise ValueError("OpenAI client not configured (missing OPENAI_API_KEY).")
-        
-        async def _call():
-            response = await client.embeddings.create(
-                input=[text],
-                model=self.model_name,
-                dimensions=self.dimension
-            )
-            return response.data[0].embedding
-            
         return await self._embed_with_retry(_call)
 
+    async def embed_documents(self, texts: List[str]) -> np.ndarray:
+        # Batches are sized by tokens (OpenAI caps a request at 2048 inputs and
+        # bounds its total tokens) and run concurrently; the limiter keeps the
+        # combined rate within the account's RPM/TPM quota.
+        batches = batch_by_tokens(texts, settings.OPENAI_EMBED_BATCH_TOKENS, 2048)
+        slots = asyncio.Semaphore(settings.OPENAI_EMBED_CONCURRENCY)
+
+        async def _batch(start: int, end: int, tokens: int) -> np.ndarray:
+            async with slots:
+                return await self._create(texts[start:end], tokens)
+
+        parts = await asyncio.gather(*(_batch(*b) for b in batches))
+        if not parts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    async def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return (
+            await self._create(texts, sum(count_tokens(t) for t in texts))
+        ).tolist()
+
+    async def embed_query(self, text: str) -> List[float]:
+        return await self.queries.embed(text)
+
+def split_for(provider: EmbeddingProvider, content: str) -> List[str]:
+    """Chunks `content` with the provider's chunk size and overlap."""
+    return chunk_markdown(content, provider.chunk_tokens, provider.chunk_overlap)
+
 _provider_instance: EmbeddingProvider | None = None
+_migration_target: EmbeddingProvider | None = None
 
 def get_provider() -> EmbeddingProvider:
     global _provider_instance
-    if _provider_instance is not None:
-        return _provider_instance
+    if _provider_instance is None:
+        _provider_instance = _build_provider(
+            os.getenv("EMBEDDING_PROVIDER", "local").lower(),
+            "EMBEDDING_SEARCH_THRESHOLD",
+            "embedding_cache",
+        )
+    return _provider_instance
 
-    provider_name = os.getenv("EMBEDDING_PROVIDER", "local").lower()
+def get_migration_target() -> Optional[EmbeddingProvider]:
+    """
+    Provider named by EMBEDDING_MIGRATE_TO while a migration is in progress:
+    ingestion writes its table too, and users whose backfill has completed
+    are searched with it. None when no migration is configured.
+    """
+    global _migration_target
+    target = settings.EMBEDDING_MIGRATE_TO
+    if not target or target == get_provider().name:
+        return None
+    if _migration_target is None:
+        _migration_target = _build_provider(
+            target, "EMBEDDING_MIGRATE_SEARCH_THRESHOLD", "migration_embedding_cache"
+        )
+    return _migration_target
+
+def provider_for_table(table_name: str) -> Optional[EmbeddingProvider]:
+    for provider in (get_provider(), get_migration_target()):
+        if provider is not None and provider.table_name == table_name:
+            return provider
+    return None
+
+def _build_provider(
+    provider_name: str, threshold_env: str, cache_gauge: str
+) -> EmbeddingProvider:
+    provider: EmbeddingProvider
     if provider_name == "local":
-        search_threshold_str = os.getenv("EMBEDDING_SEARCH_THRESHOLD")
+        search_threshold_str = os.getenv(threshold_env)
         threshold = 0.4
         if search_threshold_str:
             try:
                 threshold = float(search_threshold_str)
             except ValueError:
                 raise ValueError(
-                    f"Invalid EMBEDDING_SEARCH_THRESHOLD: {search_threshold_str}"
+                    f"Invalid {threshold_env}: {search_threshold_str}"
                 )
-        _provider_instance = LocalEmbeddingProvider(threshold=threshold)
+        provider = LocalEmbeddingProvider(threshold=threshold)
     elif provider_name == "openai":
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
@@ -193,33 +355,50 @@ def get_provider() -> EmbeddingProvider:
                 f"{dimensions_str}. Must be an integer."
             )
         
-        search_threshold_str = os.getenv("EMBEDDING_SEARCH_THRESHOLD")
+        search_threshold_str = os.getenv(threshold_env)
         threshold = 0.6
         if search_threshold_str:
             try:
                 threshold = float(search_threshold_str)
             except ValueError:
                 raise ValueError(
-                    "Invalid EMBEDDING_SEARCH_THRESHOLD value: "
+                    f"Invalid {threshold_env} value: "
                     f"{search_threshold_str}. Must be a float."
                 )
         
-        _provider_instance = OpenAIEmbeddingProvider(
+        provider = OpenAIEmbeddingProvider(
             model_name=model_name,
             dimension=dimensions,
             threshold=threshold
         )
     else:
         raise ValueError(f"Unknown EMBEDDING_PROVIDER: '{provider_name}'")
+
+    if settings.EMBEDDING_CACHE not in ("off", "memory", "postgres"):
+        raise ValueError(f"Unknown EMBEDDING_CACHE: '{settings.EMBEDDING_CACHE}'")
+    documents = store = queries = None
+    if settings.EMBEDDING_CACHE != "off":
+        documents = MemoryVectorLRU(settings.EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024)
+    if settings.EMBEDDING_CACHE == "postgres":
+        store = PostgresVectorStore(settings.EMBEDDING_CACHE_MAX_ROWS)
+    if settings.QUERY_CACHE_MEMORY_MB > 0:
+        queries = MemoryVectorLRU(
+            settings.QUERY_CACHE_MEMORY_MB * 1024 * 1024,
+            ttl=settings.QUERY_CACHE_TTL_SECONDS,
+        )
+    if documents is not None or queries is not None:
+        cached = CachedEmbeddingProvider(provider, documents, store, queries)
+        metrics.register_gauge(cache_gauge, cached.stats)
+        provider = cached
     
     print(
-        f"Initialized EmbeddingProvider: {_provider_instance.name} "
-        f"(dimension: {_provider_instance.dimension}, "
-        f"table: {_provider_instance.table_name}, "
-        f"threshold: {_provider_instance.threshold})"
+        f"Initialized EmbeddingProvider: {provider.name} "
+        f"(dimension: {provider.dimension}, "
+        f"table: {provider.table_name}, "
+        f"threshold: {provider.threshold}, "
+        f"cache: {settings.EMBEDDING_CACHE})"
     )
-    assert _provider_instance is not None
-    return _provider_instance
+    return provider
 
 class LegacyEmbeddingServiceProxy:
     def __getattr__(self, name):
@@ -229,6 +408,9 @@ embedding_service = LegacyEmbeddingServiceProxy()
 
 
 # --- Ingestion Service ---
+# Plan-and-swap rounds before giving up on a bookmark that keeps changing
+_SWAP_ATTEMPTS = 3
+
 class IngestionService:
     def __init__(self, embedding_service: Optional[EmbeddingProvider] = None):
         self._embedding_service = embedding_service
@@ -237,7 +419,14 @@ class IngestionService:
     def embedding_service(self) -> EmbeddingProvider:
         return self._embedding_service or get_provider()
 
-    async def process_bookmark(
+    def _write_providers(self) -> List[EmbeddingProvider]:
+        # During a migration every write also lands in the target's table
+        target = get_migration_target()
+        if self._embedding_service is None and target is not None:
+            return [self.embedding_service, target]
+        return [self.embedding_service]
+
+    async def save_bookmark(
         self,
         session: AsyncSession,
         user_id: str,
@@ -246,26 +435,19 @@ class IngestionService:
         content: str,
         tags: List[str] = [],
     ) -> Bookmark:
-        # 1. Check if exists for this user
+        """
+        Creates or updates the user's bookmark for `url` and flushes it,
+        without touching its chunks; `index_bookmark` embeds it later.
+        """
         stmt = select(Bookmark).where(Bookmark.url == url, Bookmark.user_id == user_id)
         result = await session.execute(stmt)
-        existing_bookmark = result.scalar_one_or_none()
-
-        provider = self.embedding_service
-        model_cls = provider.model_class
+        bookmark = result.scalar_one_or_none()
 
-        if existing_bookmark:
-            # Update existing
-            bookmark = existing_bookmark
+        if bookmark:
             bookmark.title = title
             bookmark.content_markdown = content
             bookmark.tags = tags
-            
-            # Clear old embeddings to re-ingest
-            del_stmt = delete(model_cls).where(model_cls.bookmark_id == bookmark.id)  # type: ignore
-            await session.execute(del_stmt)
         else:
-            # Create New
             bookmark = Bookmark(
                 user_id=user_id,
                 url=url,
@@ -274,47 +456,399 @@ class IngestionService:
                 tags=tags,
             )
             session.add(bookmark)
-            await session.flush() # get ID
-        
-        if not content:
-            await session.commit() # Commit updates if any
-            return bookmark
+        await session.flush()
+        return bookmark
 
-        # 2. Chunk Content
-        chunks = split_text(content)
-        
-        if not chunks:
-            return bookmark
-            
-        # 3. Embed Chunks
-        embeddings = await self.embedding_service.embed_documents(chunks)
-        
-        # 4. Create Embedding Entries
-        for i, (chunk_text, vector) in enumerate(zip(chunks, embeddings)):
-            emb_entry = model_cls(
-                bookmark_id=bookmark.id,
-                chunk_index=i,
-                chunk_text=chunk_text,
-                embedding=vector
+    async def index_bookmark(self, session: AsyncSession, bookmark_id: UUID) -> bool:
+        """
+        Brings the stored chunks of a saved bookmark in line with its current
+        content, embedding only new chunks. Returns False if the bookmark no
+        longer exists.
+
+        Stored chunks are read in a short transaction and embedded with none
+        open; the result is then applied in one short transaction (see
+        _swap_chunks), so no connection or row lock is held while the
+        provider runs.
+        """
+        for _ in range(_SWAP_ATTEMPTS):
+            bookmark = await session.get(Bookmark, bookmark_id, populate_existing=True)
+            if bookmark is None:
+                return False
+            docs = [
+                (bookmark_id, bookmark.content_hash, bookmark.content_markdown or "")
+            ]
+            plans = await self._plan_chunks(session, docs)
+            await session.commit()
+            vectors = await asyncio.gather(
+                *(self._embed_rows(plan[0], plan[4]) for plan in plans)
             )
-            session.add(emb_entry)
-            
+            if await self._swap_chunks(session, bookmark.user_id, docs, plans, vectors):
+                return True
+        raise RuntimeError(f"Chunks of bookmark {bookmark_id} kept changing")
+
+    async def _plan_chunks(
+        self,
+        session: AsyncSession,
+        docs: List[tuple[UUID, Optional[str], str]],
+    ) -> List[tuple]:
+        """
+        Diffs each (bookmark_id, stored content_hash, content) document
+        against its stored chunks in every write provider's table. Returns
+        per provider (provider, stored chunk ids per bookmark, stale ids,
+        moved rows, pending (bookmark_id, chunk_index, chunk_text) rows).
+
+        A document whose content_hash is unchanged costs nothing; an edited
+        one keeps every stored chunk whose hash still occurs (re-indexed if
+        it moved) and drops the rest. Only pending rows need vectors.
+        """
+        plans = []
+        for provider in self._write_providers():
+            model_cls = provider.model_class
+            result = await session.execute(
+                select(
+                    model_cls.id,
+                    model_cls.bookmark_id,
+                    model_cls.chunk_index,
+                    model_cls.chunk_hash,
+                ).where(
+                    col(model_cls.bookmark_id).in_([doc[0] for doc in docs])
+                )
+            )
+            stored: dict[UUID, list] = {}
+            for row in result.all():
+                stored.setdefault(row.bookmark_id, []).append(row)
+
+            stale_ids: List[UUID] = []
+            moved: List[dict] = []
+            pending: List[tuple[UUID, int, str]] = []
+            for bookmark_id, stored_hash, content in docs:
+                rows = stored.get(bookmark_id, [])
+                # Rows may be missing for an unchanged document after a
+                # provider switch, in which case it must be embedded again.
+                unchanged = stored_hash == content_fingerprint(content)
+                if unchanged and (rows or not content):
+                    continue
+                reusable: dict[Optional[str], list] = {}
+                for row in rows:
+                    reusable.setdefault(row.chunk_hash, []).append(row)
+                for i, chunk in enumerate(split_for(provider, content)):
+                    candidates = reusable.get(content_fingerprint(chunk))
+                    if not candidates:
+                        pending.append((bookmark_id, i, chunk))
+                        continue
+                    row = candidates.pop()
+                    if row.chunk_index != i:
+                        moved.append({"id": row.id, "chunk_index": i})
+                stale_ids.extend(row.id for left in reusable.values() for row in left)
+
+            snapshot = {
+                bookmark_id: {row.id for row in rows}
+                for bookmark_id, rows in stored.items()
+            }
+            plans.append((provider, snapshot, stale_ids, moved, pending))
+        return plans
+
+    async def _embed_rows(
+        self, provider: EmbeddingProvider, rows: List[tuple[UUID, int, str]]
+    ) -> np.ndarray:
+        # Chunks from different bookmarks share calls of EMBED_BATCH_SIZE
+        texts = [chunk for _, _, chunk in rows]
+        size = settings.EMBED_BATCH_SIZE
+        parts = await asyncio.gather(*(
+            provider.embed_documents(texts[i:i + size])
+            for i in range(0, len(texts), size)
+        ))
+        if not parts:
+            return np.empty((0, provider.dimension), dtype=np.float32)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    async def _swap_chunks(
+        self,
+        session: AsyncSession,
+        user_id: str,
+        docs: List[tuple[UUID, Optional[str], str]],
+        plans: List[tuple],
+        vectors: List[np.ndarray],
+    ) -> bool:
+        """
+        Applies planned chunk diffs and the documents' new content_hash in
+        one transaction on top of whatever the caller already wrote in it,
+        so searches see either a bookmark's old chunk set or its new one.
+        Rolls back and returns False if a bookmark is gone or its stored
+        chunks changed since they were planned; the caller plans again.
+        """
+        ids = [doc[0] for doc in docs]
+        locked = await session.execute(
+            select(Bookmark.id).where(col(Bookmark.id).in_(ids)).with_for_update()
+        )
+        if len(locked.all()) < len(ids):
+            await session.rollback()
+            return False
+        for (provider, snapshot, stale_ids, moved, pending), matrix in zip(
+            plans, vectors
+        ):
+            model_cls = provider.model_class
+            result = await session.execute(
+                select(model_cls.bookmark_id, model_cls.id).where(
+                    col(model_cls.bookmark_id).in_(ids)
+                )
+            )
+            current: dict[UUID, set[UUID]] = {}
+            for row in result.all():
+                current.setdefault(row.bookmark_id, set()).add(row.id)
+            if current != snapshot:
+                await session.rollback()
+                return False
+            if stale_ids:
+                await session.execute(
+                    delete(model_cls).where(col(model_cls.id).in_(stale_ids))
+                )
+            if moved:
+                await session.execute(update(model_cls), moved)
+            await copy_embeddings(session, model_cls, user_id, pending, matrix)
+
+        hashes = [
+            {"id": bookmark_id, "content_hash": content_fingerprint(content)}
+            for bookmark_id, stored_hash, content in docs
+            if stored_hash != content_fingerprint(content)
+        ]
+        if hashes:
+            await session.execute(update(Bookmark), hashes)
         await session.commit()
-        await session.refresh(bookmark)
-        return bookmark
+        return True
+
+    async def process_batch(
+        self,
+        session: AsyncSession,
+        user_id: str,
+        items: List[dict],
+    ) -> List[dict]:
+        """
+        Ingests many bookmarks at once. Each item is a dict with url, title,
+        content and tags. Unchanged chunks are kept (see _plan_chunks); the
+        remaining chunks from all documents are embedded with no transaction
+        open, then the bookmarks and their chunks are written together in
+        one short transaction (see _swap_chunks).
+
+        Returns one result dict per input item, in input order.
+        """
+        # Later duplicates of the same URL win, mirroring sequential re-saves
+        latest: dict[str, dict] = {item["url"]: item for item in items}
+        urls = list(latest)
+
+        for _ in range(_SWAP_ATTEMPTS):
+            result = await session.execute(
+                select(Bookmark.id, Bookmark.url, Bookmark.content_hash).where(
+                    Bookmark.user_id == user_id, col(Bookmark.url).in_(urls)
+                )
+            )
+            existing = {row.url: row for row in result.all()}
+            ids = {
+                url: existing[url].id if url in existing else uuid4()
+                for url in urls
+            }
+            docs = [
+                (
+                    ids[url],
+                    existing[url].content_hash if url in existing else None,
+                    latest[url]["content"],
+                )
+                for url in urls
+            ]
+            plans = await self._plan_chunks(session, docs)
+            await session.commit()
+            vectors = await asyncio.gather(
+                *(self._embed_rows(plan[0], plan[4]) for plan in plans)
+            )
+
+            changes = [
+                {
+                    "id": ids[url],
+                    "title": latest[url]["title"],
+                    "content_markdown": latest[url]["content"],
+                    "tags": latest[url]["tags"],
+                }
+                for url in urls if url in existing
+            ]
+            if changes:
+                await session.execute(update(Bookmark), changes)
+            session.add_all(
+                Bookmark(
+                    id=ids[url],
+                    user_id=user_id,
+                    url=url,
+                    title=latest[url]["title"],
+                    content_markdown=latest[url]["content"],
+                    tags=latest[url]["tags"],
+                )
+                for url in urls if url not in existing
+            )
+            await session.flush()
+            if await self._swap_chunks(session, user_id, docs, plans, vectors):
+                break
+        else:
+            raise RuntimeError("Bookmarks kept changing during batch ingestion")
+
+        return [
+            {
+                "url": item["url"],
+                "id": str(ids[item["url"]]),
+                "status": "ingested",
+                "error": None,
+            }
+            for item in items
+        ]
+
+async def replace_chunks(
+    session: AsyncSession,
+    provider: EmbeddingProvider,
+    batch: List[Any],
+    rows: List[tuple[UUID, int, str]],
+    vectors: np.ndarray,
+) -> int:
+    """
+    Replaces the provider's chunks of a re-embedded batch of bookmarks (rows
+    with id, user_id, content_markdown and the content_hash read alongside
+    it) and records their new content_hash, without committing. Returns the
+    number of chunk rows written.
+
+    The batch's bookmarks are locked first. Ones deleted since the batch was
+    read, or whose content_hash moved past both the one read and the new
+    one (ingestion already indexed an edit), are left alone.
+    """
+    model_cls = provider.model_class
+    new_hashes = {
+        b.id: content_fingerprint(b.content_markdown)
+        for b in batch if b.content_markdown
+    }
+    locked = await session.execute(
+        select(Bookmark.id, Bookmark.content_hash).where(
+            col(Bookmark.id).in_([b.id for b in batch])
+        ).with_for_update()
+    )
+    current = {row.id: row.content_hash for row in locked.all()}
+    fresh = {
+        b.id for b in batch
+        if b.id in current
+        and current[b.id] in (b.content_hash, new_hashes.get(b.id))
+    }
+    if fresh:
+        await session.execute(delete(model_cls).where(
+            col(model_cls.bookmark_id).in_(list(fresh))
+        ))
+    users = {b.id: b.user_id for b in batch if b.id in fresh}
+    written = 0
+    for user_id in set(users.values()):
+        picked = [i for i, row in enumerate(rows) if users.get(row[0]) == user_id]
+        await copy_embeddings(
+            session, model_cls, user_id, [rows[i] for i in picked], vectors[picked]
+        )
+        written += len(picked)
+    hashes = [
+        {"id": bookmark_id, "content_hash": content_hash}
+        for bookmark_id, content_hash in new_hashes.items()
+        if bookmark_id in fresh
+    ]
+    if hashes:
+        await session.execute(update(Bookmark), hashes)
+    return written
 
 ingestion_service = IngestionService()
 
 
 # --- Search Service ---
+# List views never return the article body; raiseload turns an accidental
+# access into an error instead of a lazy load per row.
+_WITHOUT_CONTENT = defer(
+    Bookmark.content_markdown, raiseload=True  # type: ignore[arg-type]
+)
+
+NO_CONTEXT_ANSWER = (
+    "I couldn't find any relevant bookmarks to answer your question."
+)
+
+CHAT_SYSTEM_PROMPT = """
+You are a helpful assistant oriented to guide users in finding relevant
+information from their bookmarks.
+
+You are provided with excerpts from the top relevant articles.
+Answer questions strictly using the provided article context.
+
+Rules:
+- Use ONLY the provided context.
+- Do NOT use outside knowledge.
+- If the answer is not clearly supported or your confidence is low, just say
+  "I don't know based on the provided context."
+- Do not infer or assume missing information.
+- If partial information exists, clearly state the limitations.
+
+Formatting requirements:
+- Provide a structured answer.
+- Trail your answer with a list of sources (URLs).
+- Use headings when helpful.
+- Use bullet points for lists.
+- Use code blocks for code snippets.
+- Be precise and technically accurate.
+- Avoid unnecessary verbosity.
+"""
+
+def _mock_answer(context_text: str) -> str:
+    return (
+        "**[Mock AI Response]**\n\nBased on your bookmarks, "
+        "here is what I found:\n\n"
+        f"{context_text[:500]}... (truncated for mock)\n\n"
+        "*Note: Set OPENAI_API_KEY to get real answers.*"
+    )
+
 class SearchService:
     def __init__(self, embedding_service: Optional[EmbeddingProvider] = None):
         self._embedding_service = embedding_service
+        # Set from the installed pgvector version in `configure_pgvector`
+        self.iterative_scan = "off"
+        # user_id -> monotonic time until which their cutover is trusted
+        self._migrated: dict[str, float] = {}
+
+    def configure_pgvector(self, version: Optional[str]) -> None:
+        """Enables iterative HNSW scans when pgvector >= 0.8 is installed."""
+        try:
+            major, minor = (int(p) for p in (version or "").split(".")[:2])
+        except ValueError:
+            return
+        if (major, minor) >= (0, 8):
+            self.iterative_scan = settings.SEARCH_ITERATIVE_SCAN
 
     @property
     def embedding_service(self) -> EmbeddingProvider:
         return self._embedding_service or get_provider()
 
+    async def provider_for(self, user_id: str) -> EmbeddingProvider:
+        """
+        Provider (and so vector table) to search for `user_id`. While an
+        EMBEDDING_MIGRATE_TO migration runs, a user cuts over to the target
+        once their latest backfill job into it has completed; the current
+        provider serves them until then. The check uses its own short
+        session, so no transaction stays open across the query embedding,
+        and a cutover is re-checked after MIGRATION_CUTOVER_TTL_SECONDS in
+        case the backfill was restarted.
+        """
+        target = get_migration_target()
+        if self._embedding_service is not None or target is None:
+            return self.embedding_service
+        if self._migrated.get(user_id, 0.0) < time.monotonic():
+            self._migrated.pop(user_id, None)
+            async with AsyncSessionLocal() as session:
+                status = (await session.execute(text("""
+                    SELECT status FROM reembed_jobs
+                    WHERE user_id = :uid AND provider = :provider
+                    ORDER BY created_at DESC LIMIT 1
+                """), {"uid": user_id, "provider": target.table_name})).scalar()
+            if status != "completed":
+                return self.embedding_service
+            self._migrated[user_id] = (
+                time.monotonic() + settings.MIGRATION_CUTOVER_TTL_SECONDS
+            )
+        return target
+
     async def search(
         self,
         session: AsyncSession,
@@ -322,121 +856,340 @@ class SearchService:
         query: str,
         limit: int = 5,
         threshold: Optional[float] = None,
-    ):
-        provider = self.embedding_service
+        ef_search: Optional[int] = None,
+        candidate_multiplier: Optional[int] = None,
+        exact: bool = False,
+    ) -> List[Any]:
+        """
+        Returns up to `limit` hits, one per bookmark, best first. Each hit is
+        a row of bookmark_id, url, title, chunk_index, chunk_text and
+        distance (of the bookmark's best chunk); vectors and content_markdown
+        are never loaded. With SEARCH_HYBRID on, the vector ranking is fused
+        with full-text rankings over chunk text and over title/url using
+        reciprocal rank fusion, so exact keywords surface even when their
+        embeddings are not close to the query's.
+
+        Recall/latency knobs (defaults from settings): `ef_search` is the
+        HNSW search breadth, `candidate_multiplier` the number of chunk
+        candidates fetched per requested result, and `exact` bypasses the
+        HNSW index. Candidates are widened until `limit` bookmarks pass
+        `threshold` or SEARCH_MAX_CANDIDATES is reached.
+        """
+        provider = await self.provider_for(user_id)
         model_cls = provider.model_class
         if threshold is None:
             threshold = provider.threshold
 
         # 1. Embed Query
-        query_vector = await self.embedding_service.embed_query(query)
+        started = time.perf_counter()
+        query_vector = await provider.embed_query(query)
+        metrics.observe("embed_query_seconds", time.perf_counter() - started)
         
-        # 2. Vector Search with Join
-        # Return tuple (BookmarkEmbedding, Bookmark, distance)
-        # Filter by user_id on Bookmark
+        # 2. Tenant-filtered vector search
         # Fetch more candidates than limit to allow for deduplication AND
         # threshold filtering
-        candidate_limit = limit * 4 
-        
-        # Define distance expression for selection and ordering
-        distance_col = model_cls.embedding.cosine_distance(query_vector).label(
-            "distance"
-        )
-        
-        stmt = select(model_cls, Bookmark, distance_col).join(Bookmark).where(
-            Bookmark.user_id == user_id
-        ).order_by(
-            distance_col
-        ).limit(candidate_limit)
-        
-        result = await session.execute(stmt)
-        all_matches = result.all()
-        
-        # Deduplicate & Filter: Keep only the best matching chunk per bookmark
-        # that meets the threshold
-        unique_results = []
-        seen_bookmarks = set()
-        
-        for embedding, bookmark, distance in all_matches:
-            # Skip if distance is too high (low similarity)
+        multiplier = candidate_multiplier or settings.SEARCH_CANDIDATE_MULTIPLIER
+        candidate_limit = base_limit = limit * multiplier
+        if not exact:
+            exact = await self._is_small_tenant(session, model_cls, user_id)
+        metrics.incr("search.exact_scans" if exact else "search.index_scans")
+        started = time.perf_counter()
+        while True:
+            hits = await self._vector_candidates(
+                session, model_cls, user_id, query_vector, candidate_limit, exact,
+                ef_search or settings.SEARCH_EF_SEARCH,
+            )
             # Cosine distance: 0 = identical, 1 = orthogonal, 2 = opposite
             # Threshold 0.4 filters out unrelated BGE embeddings (which hover
             # around 0.45-0.5)
-            if distance > threshold:
-                continue
+            unique_results = [h for h in hits if h.distance <= threshold][:limit]
 
-            if bookmark.id not in seen_bookmarks:
-                unique_results.append((embedding, bookmark, distance))
-                seen_bookmarks.add(bookmark.id)
-                
-            if len(unique_results) >= limit:
+            # Candidates are taken nearest first, so widening only helps
+            # while the farthest one fetched still passes the threshold
+            if (
+                len(unique_results) >= limit
+                or not hits
+                or hits[0].fetched < candidate_limit
+                or hits[0].farthest > threshold
+                or candidate_limit >= settings.SEARCH_MAX_CANDIDATES
+            ):
                 break
+            candidate_limit = min(candidate_limit * 2, settings.SEARCH_MAX_CANDIDATES)
+            metrics.incr("search.widened")
+        metrics.observe("search_vector_seconds", time.perf_counter() - started)
                 
-        return unique_results
+        chunk_fts = model_cls.__tablename__ in _fts_tables
+        title_fts = "bookmarks" in _fts_tables
+        if not settings.SEARCH_HYBRID or not (chunk_fts or title_fts):
+            return unique_results
 
-    async def chat(
+        # 3. Lexical candidates: chunk text, then title/url
+        distance = model_cls.embedding.cosine_distance(query_vector)
+        ts_query = func.websearch_to_tsquery("english", query)
+        chunk_rows: Any = []
+        if chunk_fts:
+            chunk_tsv = literal_column(f"{model_cls.__tablename__}.chunk_tsv")
+            chunk_rows = (await session.execute(
+                select(*self._hit_columns(model_cls, distance)).join(Bookmark).where(
+                    model_cls.user_id == user_id, chunk_tsv.op("@@")(ts_query)
+                ).order_by(
+                    func.ts_rank_cd(chunk_tsv, ts_query).desc()
+                ).limit(base_limit)
+            )).all()
+        title_ids: Any = []
+        if title_fts:
+            bookmark_tsv = literal_column("bookmarks.search_tsv")
+            title_ids = (await session.execute(
+                select(Bookmark.id).where(
+                    Bookmark.user_id == user_id, bookmark_tsv.op("@@")(ts_query)
+                ).order_by(
+                    func.ts_rank_cd(bookmark_tsv, ts_query).desc()
+                ).limit(base_limit)
+            )).scalars().all()
+
+        # 4. Reciprocal rank fusion over per-bookmark rankings
+        best: dict[UUID, Any] = {}
+        scores: dict[UUID, float] = {}
+
+        def _fuse(bookmark_ids) -> None:
+            ranked = list(dict.fromkeys(bookmark_ids))
+            for rank, bookmark_id in enumerate(ranked, start=1):
+                scores[bookmark_id] = (
+                    scores.get(bookmark_id, 0.0) + 1 / (settings.SEARCH_RRF_K + rank)
+                )
+
+        for hit in [*unique_results, *chunk_rows]:
+            best.setdefault(hit.bookmark_id, hit)
+        _fuse(hit.bookmark_id for hit in unique_results)
+        _fuse(hit.bookmark_id for hit in chunk_rows)
+        _fuse(title_ids)
+
+        ranked_ids = sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
+        missing = [bid for bid in ranked_ids if bid not in best]
+        if missing:
+            # Title/url-only matches: represent them by their closest chunk
+            rows = (await session.execute(
+                select(*self._hit_columns(model_cls, distance)).join(Bookmark).where(
+                    col(model_cls.bookmark_id).in_(missing)
+                ).distinct(
+                    model_cls.bookmark_id
+                ).order_by(model_cls.bookmark_id, distance)
+            )).all()
+            for hit in rows:
+                best.setdefault(hit.bookmark_id, hit)
+        return [best[bid] for bid in ranked_ids if bid in best]
+
+    @staticmethod
+    def _hit_columns(model_cls: Type[Any], distance: Any) -> List[Any]:
+        return [
+            model_cls.bookmark_id,
+            Bookmark.url,
+            Bookmark.title,
+            model_cls.chunk_index,
+            model_cls.chunk_text,
+            distance.label("distance"),
+        ]
+
+    async def _is_small_tenant(
+        self, session: AsyncSession, model_cls: Type[Any], user_id: str
+    ) -> bool:
+        exact_max = settings.SEARCH_EXACT_MAX_CHUNKS
+        user_chunks = (await session.execute(
+            select(func.count()).select_from(
+                select(model_cls.id).where(
+                    model_cls.user_id == user_id
+                ).limit(exact_max + 1).subquery()
+            )
+        )).scalar_one()
+        return user_chunks <= exact_max
+
+    async def _vector_candidates(
+        self,
+        session: AsyncSession,
+        model_cls: Type[Any],
+        user_id: str,
+        query_vector: List[float],
+        candidate_limit: int,
+        exact: bool,
+        ef_search: int,
+    ) -> List[Any]:
+        """
+        Takes the `candidate_limit` chunks of `user_id` nearest to the query
+        and returns the best one per bookmark, nearest first, as hit rows (see
+        `search`) plus `fetched` (candidates taken) and `farthest` (distance
+        of the last one), which drive adaptive widening. Deduplication runs
+        in SQL with DISTINCT ON over the index-ordered candidate subquery.
+
+        The tenant filter is on the embedding table's own user_id column, so
+        it is applied during the scan instead of after it:
+
+        - `exact` (users with at most SEARCH_EXACT_MAX_CHUNKS chunks, or on
+          request) scans just the user's rows; a materialized CTE keeps the
+          planner off the global HNSW index. Faster for small users, and
+          exact;
+        - otherwise the HNSW index is used with pgvector's iterative scan,
+          which keeps walking the graph until enough rows pass the filter
+          rather than returning other tenants' neighbours. `ef_search` is
+          raised to at least `candidate_limit`, pgvector's cap is 1000.
+
+        Together the two paths cover small and large tenants without
+        per-tenant partial indexes and the DDL they would need per user.
+        """
+        distance = model_cls.embedding.cosine_distance(query_vector)
+
+        if exact:
+            scored = select(
+                model_cls.bookmark_id,
+                model_cls.chunk_index,
+                model_cls.chunk_text,
+                distance.label("distance"),
+            ).where(
+                model_cls.user_id == user_id
+            ).cte("user_chunks").prefix_with("MATERIALIZED")
+            candidates = core_select(scored).order_by(scored.c.distance)
+        else:
+            ef_search = min(max(ef_search, candidate_limit), 1000)
+            await session.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+            if self.iterative_scan != "off":
+                await session.execute(text(
+                    f"SET LOCAL hnsw.iterative_scan = {self.iterative_scan}"
+                ))
+            candidates = select(
+                model_cls.bookmark_id,
+                model_cls.chunk_index,
+                model_cls.chunk_text,
+                distance.label("distance"),
+            ).where(
+                model_cls.user_id == user_id
+            ).order_by(distance)
+
+        nearest = candidates.limit(candidate_limit).subquery("nearest")
+        # Window aggregates sit outside the LIMIT so the index scan survives
+        counted = core_select(
+            nearest,
+            func.count().over().label("fetched"),
+            func.max(nearest.c.distance).over().label("farthest"),
+        ).subquery("counted")
+        per_bookmark = core_select(counted).distinct(
+            counted.c.bookmark_id
+        ).order_by(
+            counted.c.bookmark_id, counted.c.distance
+        ).subquery("per_bookmark")
+        result = await session.execute(
+            core_select(
+                per_bookmark.c.bookmark_id,
+                col(Bookmark.url),
+                col(Bookmark.title),
+                per_bookmark.c.chunk_index,
+                per_bookmark.c.chunk_text,
+                per_bookmark.c.distance,
+                per_bookmark.c.fetched,
+                per_bookmark.c.farthest,
+            ).join(
+                Bookmark, col(Bookmark.id) == per_bookmark.c.bookmark_id
+            ).order_by(per_bookmark.c.distance)
+        )
+        return list(result.all())
+
+    async def _chat_context(
         self, session: AsyncSession, user_id: str, query: str
     ) -> tuple[str, List[str]]:
-        # 1. Retrieve Context (Get more candidates to find unique bookmarks)
-        # Re-using search but looking for top unique bookmarks
-        results = await self.search(session, user_id, query, limit=5)
-        
+        # 1. Retrieve Context: best chunk per bookmark, top sources first
+        results = await self.search(
+            session, user_id, query, limit=settings.CHAT_CONTEXT_SOURCES
+        )
         if not results:
-            return "I couldn't find any relevant bookmarks to answer your question.", []
-            
+            return "", []
+
+        # 2. Load each hit's neighbouring chunks so excerpts read in context
+        model_cls = (await self.provider_for(user_id)).model_class
+        radius = settings.CHAT_CONTEXT_NEIGHBOURS
+        windows = [
+            (col(model_cls.bookmark_id) == hit.bookmark_id)
+            & col(model_cls.chunk_index).between(
+                hit.chunk_index - radius, hit.chunk_index + radius
+            )
+            for hit in results
+        ]
+        rows = await session.execute(
+            select(
+                model_cls.bookmark_id, model_cls.chunk_index, model_cls.chunk_text
+            ).where(or_(*windows))
+        )
+        chunk_text = {(r.bookmark_id, r.chunk_index): r.chunk_text for r in rows}
+
+        # 3. Spend the token budget: every source's best chunk first, then
+        # neighbours ring by ring (distance 1 for all sources, then 2, ...)
+        budget = settings.CHAT_CONTEXT_TOKENS
+        picked: dict[UUID, dict[int, str]] = {}
+        for distance in range(radius + 1):
+            for hit in results:
+                for index in {hit.chunk_index - distance, hit.chunk_index + distance}:
+                    key = (hit.bookmark_id, index)
+                    chunk = chunk_text.get(key)
+                    if chunk is None or index in picked.get(hit.bookmark_id, {}):
+                        continue
+                    cost = count_tokens(chunk)
+                    if cost > budget:
+                        if picked:
+                            continue
+                        # Never send an empty context for an oversized top hit
+                        chunk, cost = truncate_tokens(chunk, budget), budget
+                    picked.setdefault(hit.bookmark_id, {})[index] = chunk
+                    budget -= cost
+
         context_text = ""
         sources = []
-        
-        # Deduplicate and take top 3 unique bookmarks
-        unique_bookmarks = []
-        seen_ids = set()
-        
-        for embedding_entry, bookmark, _distance in results:
-            if bookmark.id not in seen_ids:
-                unique_bookmarks.append(bookmark)
-                seen_ids.add(bookmark.id)
-                if len(unique_bookmarks) >= 3:
-                    break
-        
-        for i, bookmark in enumerate(unique_bookmarks):
-            # Use FULL content (truncate if extremely large, but for now take all)
-            # A safety truncation could be added here if needed (e.g. [:20000])
-            content = bookmark.content_markdown or ""
-            context_text += f"Source {i+1} ({bookmark.title}):\n{content}\n\n"
-            sources.append(bookmark.url)
-            
+        for hit in results:
+            chunks = picked.get(hit.bookmark_id)
+            if not chunks:
+                continue
+            sources.append(hit.url)
+            excerpt, previous = "", None
+            for index in sorted(chunks):
+                if previous is None:
+                    excerpt = chunks[index]
+                elif index == previous + 1:
+                    excerpt = _join_overlapping(excerpt, chunks[index])
+                else:
+                    excerpt += "\n[...]\n" + chunks[index]
+                previous = index
+            context_text += f"Source {len(sources)} ({hit.title}):\n{excerpt}\n\n"
+
         print(
-            f"--- Sending Context ({len(context_text)} chars) ---\n"
+            f"--- Sending Context ({settings.CHAT_CONTEXT_TOKENS - budget} tokens, "
+            f"{len(sources)} sources) ---\n"
             f"{context_text[:500]}...\n--- End Preview ---"
         )
+        return context_text, sources
 
-        # 2. LLM Generation
-        llm_provider = os.getenv("LLM_PROVIDER", "openai").lower()
-        
-        system_prompt = """
-You are a helpful assistant oriented to guide users in finding relevant
-information from their bookmarks.
-
-You are provided with the FULL TEXT of the top relevant articles.
-Answer questions strictly using the provided article context.
+    def _chat_messages(
+        self, context_text: str, query: str, sources: List[str]
+    ) -> List[dict]:
+        return [
+            {
+                "role": "system",
+                "content": CHAT_SYSTEM_PROMPT.strip(),
+            },
+            {
+                "role": "user",
+                "content": (
+                    f"Context:\n{context_text}\n\n"
+                    f"Question: {query}\n\nSources:\n{sources}"
+                ),
+            },
+        ]
 
-Rules:
-- Use ONLY the provided context.
-- Do NOT use outside knowledge.
-- If the answer is not clearly supported or your confidence is low, just say
-  "I don't know based on the provided context."
-- Do not infer or assume missing information.
-- If partial information exists, clearly state the limitations.
+    async def chat(
+        self, session: AsyncSession, user_id: str, query: str
+    ) -> tuple[str, List[str]]:
+        context_text, sources = await self._chat_context(session, user_id, query)
+        if not sources:
+            return NO_CONTEXT_ANSWER, []
 
-Formatting requirements:
-- Provide a structured answer.
-- Trail your answer with a list of sources (URLs).
-- Use headings when helpful.
-- Use bullet points for lists.
-- Use code blocks for code snippets.
-- Be precise and technically accurate.
-- Avoid unnecessary verbosity.
-"""
+        # 2. LLM Generation
+        llm_provider = os.getenv("LLM_PROVIDER", "openai").lower()
+        messages = self._chat_messages(context_text, query, sources)
 
         if llm_provider == "ollama":
             ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
@@ -445,19 +1198,7 @@ Formatting requirements:
                 async with httpx.AsyncClient() as client:
                     payload = {
                         "model": ollama_model,
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": system_prompt.strip(),
-                            },
-                            {
-                                "role": "user",
-                                "content": (
-                                    f"Context:\n{context_text}\n\n"
-                                    f"Question: {query}\n\nSources:\n{sources}"
-                                ),
-                            },
-                        ],
+                        "messages": messages,
                         "stream": False
                     }
                     response = await client.post(
@@ -477,40 +1218,100 @@ Formatting requirements:
 
         client = _get_openai_client()
         if not client:
-            # Fallback Mock
-            answer = (
-                "**[Mock AI Response]**\n\nBased on your bookmarks, "
-                "here is what I found:\n\n"
-                f"{context_text[:500]}... (truncated for mock)\n\n"
-                "*Note: Set OPENAI_API_KEY to get real answers.*"
-            )
-            return answer, sources
+            return _mock_answer(context_text), sources
 
         try:
             response = await client.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt.strip(),
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            f"Context:\n{context_text}\n\n"
-                            f"Question: {query}\n\nSources:\n{sources}"
-                        ),
-                    },
-                ]
+                messages=messages,  # type: ignore[arg-type]
             )
             content = response.choices[0].message.content or ""
             return content, sources
         except Exception as e:
             return f"Error contacting OpenAI: {str(e)}", sources
 
+    async def chat_stream(
+        self, user_id: str, query: str
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """
+        Streaming variant of `chat`. Yields ("sources", urls) as soon as
+        retrieval is done, then ("token", text) for each piece of the answer
+        as the LLM produces it. Failures after sources were sent are yielded
+        as ("error", message). Opens its own session and releases it before
+        generation starts, so the database connection is not held for the
+        length of the LLM response.
+        """
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as session:
+            context_text, sources = await self._chat_context(
+                session, user_id, query
+            )
+        metrics.observe("chat_retrieval_seconds", time.perf_counter() - started)
+        yield "sources", sources
+        if not sources:
+            yield "token", NO_CONTEXT_ANSWER
+            return
+
+        llm_provider = os.getenv("LLM_PROVIDER", "openai").lower()
+        messages = self._chat_messages(context_text, query, sources)
+        if llm_provider == "ollama":
+            tokens = self._stream_ollama(messages)
+        else:
+            tokens = self._stream_openai(messages, context_text)
+
+        first = True
+        try:
+            async for token in tokens:
+                if first:
+                    first = False
+                    metrics.observe(
+                        "chat_ttft_seconds", time.perf_counter() - started
+                    )
+                yield "token", token
+        except Exception as e:
+            backend = "Ollama" if llm_provider == "ollama" else "OpenAI"
+            yield "error", f"Error contacting {backend}: {str(e)}"
+        metrics.observe("chat_stream_seconds", time.perf_counter() - started)
+
+    async def _stream_ollama(self, messages: List[dict]) -> AsyncIterator[str]:
+        ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        ollama_model = os.getenv("OLLAMA_MODEL", "mistral:7b-instruct-q4_K_M")
+        payload = {"model": ollama_model, "messages": messages, "stream": True}
+        async with httpx.AsyncClient() as client:
+            async with client.stream(
+                "POST", f"{ollama_base_url}/api/chat", json=payload, timeout=60.0
+            ) as response:
+                response.raise_for_status()
+                # Ollama streams one JSON object per line
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    content = data.get("message", {}).get("content")
+                    if content:
+                        yield content
+                    if data.get("done"):
+                        break
+
+    async def _stream_openai(
+        self, messages: List[dict], context_text: str
+    ) -> AsyncIterator[str]:
+        client = _get_openai_client()
+        if not client:
+            yield _mock_answer(context_text)
+            return
+        stream = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,  # type: ignore[arg-type]
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
     async def get_recent(self, session: AsyncSession, user_id: str, limit: int = 10):
         # Return list of Bookmarks
-        stmt = select(Bookmark).where(
+        stmt = select(Bookmark).options(_WITHOUT_CONTENT).where(
             Bookmark.user_id == user_id
         ).order_by(
             col(Bookmark.created_at).desc()
@@ -522,9 +1323,6 @@ search_service = SearchService()
 
 # --- Management Service ---
 class ManagementService:
-    def __init__(self):
-        self.reembed_jobs: dict[str, dict] = {}
-
     async def get_bookmarks(
         self,
         session: AsyncSession,
@@ -533,48 +1331,98 @@ class ManagementService:
         limit: int = 50,
         tag_prefix: Optional[str] = None,
         query: Optional[str] = None,
+        cursor: Optional[str] = None,
     ):
+        """
+        Returns (bookmarks, total, next_cursor), newest first. Pass the
+        previous page's `next_cursor` to continue with a keyset seek on
+        (created_at, id) instead of `skip`. `total` comes from the
+        trigger-maintained bookmark_counts row when unfiltered; filtered
+        totals are counted only for the first page and are None on cursor
+        pages (the client keeps the first page's value).
+        """
         base = select(Bookmark).where(Bookmark.user_id == user_id)
+        filtered = False
         
         if tag_prefix:
+            filtered = True
             if tag_prefix == "untagged":
                 base = base.where(
                     (Bookmark.tags == '{}') | (Bookmark.tags == None)  # noqa: E711
                 )
             else:
-                # Match exact tag or nested tags under this prefix
+                # Match exact tag or nested tags under this prefix: resolve the
+                # tag names from tag_counts, then hit the GIN index on tags
                 base = base.where(
                     text(
-                        "EXISTS (SELECT 1 FROM unnest(tags) tag WHERE "
-                        "tag = :tag_exact OR tag LIKE :tag_prefix)"
+                        "tags && CAST(ARRAY(SELECT tag FROM tag_counts "
+                        "WHERE user_id = :tag_user AND "
+                        "(tag = :tag_exact OR tag LIKE :tag_prefix)) AS VARCHAR[])"
                     )
-                ).params(tag_exact=tag_prefix, tag_prefix=f"{tag_prefix}/%")
+                ).params(
+                    tag_user=user_id,
+                    tag_exact=tag_prefix,
+                    tag_prefix=f"{_like_escape(tag_prefix)}/%",
+                )
             
         if query:
-            base = base.where(
-                col(Bookmark.title).ilike(f"%{query}%")
-                | col(Bookmark.url).ilike(f"%{query}%")
+            # Substring match on title/url, plus a prefix match on every
+            # stemmed word via search_tsv: the tsquery alone misses
+            # stopword-only queries and fragments from the middle of a url
+            filtered = True
+            pattern = f"%{_like_escape(query)}%"
+            condition = (
+                col(Bookmark.title).ilike(pattern) | col(Bookmark.url).ilike(pattern)
             )
+            words = re.findall(r"\w+", query)
+            if words and "bookmarks" in _fts_tables:
+                condition = condition | literal_column("bookmarks.search_tsv").op(
+                    "@@"
+                )(func.to_tsquery("english", " & ".join(f"{w}:*" for w in words)))
+            base = base.where(condition)
             
         # Get total count
-        count_stmt = select(func.count()).select_from(base.subquery())
-        total_result = await session.execute(count_stmt)
-        total = total_result.scalar_one()
+        total: Optional[int] = None
+        if not filtered:
+            total = (await session.execute(text(
+                "SELECT total FROM bookmark_counts WHERE user_id = :uid"
+            ), {"uid": user_id})).scalar_one_or_none() or 0
+        elif cursor is None:
+            count_stmt = select(func.count()).select_from(base.subquery())
+            total = (await session.execute(count_stmt)).scalar_one()
         
-        # Get paginated results
-        stmt = base.order_by(col(Bookmark.created_at).desc()).offset(skip).limit(limit)
+        # Get paginated results: one extra row tells whether a next page exists
+        stmt = base.options(_WITHOUT_CONTENT).order_by(
+            col(Bookmark.created_at).desc(), col(Bookmark.id).desc()
+        ).limit(limit + 1)
+        if cursor is not None:
+            created_at, bookmark_id = decode_cursor(cursor)
+            # Typed binds: an untyped datetime is sent as timestamp without
+            # time zone and shifted by the session time zone
+            stmt = stmt.where(
+                tuple_(col(Bookmark.created_at), col(Bookmark.id)) < tuple_(
+                    literal(created_at, DateTime(timezone=True)),
+                    literal(bookmark_id, Uuid()),
+                )
+            )
+        else:
+            stmt = stmt.offset(skip)
         result = await session.execute(stmt)
-        bookmarks = result.scalars().all()
+        bookmarks = list(result.scalars().all())
         
-        return bookmarks, total
+        next_cursor = None
+        if len(bookmarks) > limit:
+            bookmarks = bookmarks[:limit]
+            last = bookmarks[-1]
+            assert last.created_at is not None and last.id is not None
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return bookmarks, total, next_cursor
 
     async def get_tags(self, session: AsyncSession, user_id: str):
-        # Return unique tags and their counts for the user
+        # Return unique tags and their counts for the user (trigger-maintained)
         stmt = text("""
-            SELECT tag, count(*) as count
-            FROM bookmarks, unnest(tags) as tag
+            SELECT tag, count FROM tag_counts
             WHERE user_id = :user_id
-            GROUP BY tag
             ORDER BY tag
         """)
         result = await session.execute(stmt, {"user_id": user_id})
@@ -588,7 +1436,7 @@ class ManagementService:
         title: Optional[str] = None,
         tags: Optional[List[str]] = None,
     ):
-        stmt = select(Bookmark).where(
+        stmt = select(Bookmark).options(_WITHOUT_CONTENT).where(
             Bookmark.id == bookmark_id, Bookmark.user_id == user_id
         )
         result = await session.execute(stmt)
@@ -603,9 +1451,20 @@ class ManagementService:
             
         bookmark.updated_at = datetime.utcnow()
         await session.commit()
-        await session.refresh(bookmark)
+        await session.refresh(bookmark, ["title", "tags", "created_at", "updated_at"])
         return bookmark
 
+    async def get_content(
+        self, session: AsyncSession, user_id: str, bookmark_id: str
+    ) -> Optional[tuple[UUID, Optional[str]]]:
+        result = await session.execute(
+            select(Bookmark.id, Bookmark.content_markdown).where(
+                Bookmark.id == bookmark_id, Bookmark.user_id == user_id
+            )
+        )
+        row = result.one_or_none()
+        return (row.id, row.content_markdown) if row else None
+
     async def delete_bookmark(
         self, session: AsyncSession, user_id: str, bookmark_id: str
     ):
@@ -709,65 +1568,5 @@ class ManagementService:
         await session.commit()
         return getattr(result, "rowcount", 0)
 
-    async def reembed_user_bookmarks(self, user_id: str):
-        self.reembed_jobs[user_id] = {
-            "status": "starting",
-            "total": 0,
-            "processed": 0,
-            "error": None,
-        }
-        
-        try:
-            async for session in get_session():
-                id_rows = await session.execute(
-                    select(Bookmark.id).where(Bookmark.user_id == user_id)
-                )
-                ids = [row[0] for row in id_rows.all()]
-                total = len(ids)
-                self.reembed_jobs[user_id].update(total=total, status="running")
-                
-                if total == 0:
-                    self.reembed_jobs[user_id]["status"] = "completed"
-                    break
-                
-                processed = 0
-                for bid in ids:
-                    b = (await session.execute(
-                        select(Bookmark).where(Bookmark.id == bid)
-                    )).scalar_one()
-                    
-                    provider = get_provider()
-                    model_cls = provider.model_class
-                    if b.content_markdown:
-                        chunks = split_text(b.content_markdown)
-                        if chunks:
-                            await session.execute(
-                                delete(model_cls).where(
-                                    model_cls.bookmark_id == b.id  # type: ignore
-                                )
-                            )
-                            embeddings = await provider.embed_documents(chunks)
-                            for i, (chunk_text, vector) in enumerate(
-                                zip(chunks, embeddings)
-                            ):
-                                session.add(model_cls(
-                                    bookmark_id=b.id, chunk_index=i,
-                                    chunk_text=chunk_text, embedding=vector,
-                                ))
-                    
-                    await session.commit()
-                    session.expunge(b)  # drop from identity map immediately
-                    _release_memory()   # see A2
-                    processed += 1
-                    self.reembed_jobs[user_id]["processed"] = processed
-                    
-                self.reembed_jobs[user_id]["status"] = "completed"
-                break # Only need one session from the generator
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            self.reembed_jobs[user_id]["status"] = "failed"
-            self.reembed_jobs[user_id]["error"] = str(e)
-
 management_service = ManagementService()
 
@@ -16,6 +16,10 @@ elif len(JWT_SECRET) < 32:
 
 JWT_SECRET_PREVIOUS = os.getenv("JWT_SECRET_PREVIOUS")
 
+# Static bearer token for scraping /metrics without a user session; when unset
+# /metrics accepts a signed-in user's access token instead
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 # Default values specified in the spec:
 # JWT_ACCESS_TTL_SECONDS: 30 minutes (1800)
 # JWT_REFRESH_TTL_SECONDS: 90 days (7776000)
@@ -33,3 +37,324 @@ JWT_ISSUER = os.getenv("JWT_ISSUER", "smart-bookmark-manager")
 JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "api")
 
 
+# Batch ingestion
+try:
+    INGEST_BATCH_MAX_ITEMS = int(os.getenv("INGEST_BATCH_MAX_ITEMS", "500"))
+except ValueError:
+    INGEST_BATCH_MAX_ITEMS = 500
+
+# Number of chunks sent to the embedding provider per call when ingesting
+# several documents at once. Chunks from different bookmarks share a call.
+try:
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+except ValueError:
+    EMBED_BATCH_SIZE = 256
+
+# Bookmarks per transaction on the streaming NDJSON ingest endpoint
+try:
+    INGEST_STREAM_WINDOW = int(os.getenv("INGEST_STREAM_WINDOW", "100"))
+except ValueError:
+    INGEST_STREAM_WINDOW = 100
+
+# Largest request body the streaming NDJSON ingest endpoint accepts, in MB;
+# the whole body is read before the first window is processed
+try:
+    INGEST_STREAM_MAX_MB = int(os.getenv("INGEST_STREAM_MAX_MB", "32"))
+except ValueError:
+    INGEST_STREAM_MAX_MB = 32
+
+# Provider migration: while EMBEDDING_MIGRATE_TO names a provider other than
+# EMBEDDING_PROVIDER, ingestion writes both tables and every user is backfilled
+# into the target (MIGRATION_MAX_JOBS users at a time, pausing between
+# batches); each user's searches cut over once their backfill completes.
+EMBEDDING_MIGRATE_TO = os.getenv("EMBEDDING_MIGRATE_TO", "").lower()
+
+try:
+    MIGRATION_MAX_JOBS = int(os.getenv("MIGRATION_MAX_JOBS", "1"))
+except ValueError:
+    MIGRATION_MAX_JOBS = 1
+
+try:
+    MIGRATION_BATCH_PAUSE_SECONDS = float(
+        os.getenv("MIGRATION_BATCH_PAUSE_SECONDS", "1")
+    )
+except ValueError:
+    MIGRATION_BATCH_PAUSE_SECONDS = 1.0
+
+try:
+    MIGRATION_RETRY_SECONDS = float(os.getenv("MIGRATION_RETRY_SECONDS", "600"))
+except ValueError:
+    MIGRATION_RETRY_SECONDS = 600.0
+
+# How long a user's search cutover to the migration target is trusted before
+# their latest backfill job is checked again
+try:
+    MIGRATION_CUTOVER_TTL_SECONDS = float(
+        os.getenv("MIGRATION_CUTOVER_TTL_SECONDS", "60")
+    )
+except ValueError:
+    MIGRATION_CUTOVER_TTL_SECONDS = 60.0
+
+# Embedding cache: "off", "memory" (in-process LRU only) or "postgres"
+# (LRU in front of the durable embedding_cache table)
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "postgres").lower()
+
+try:
+    EMBEDDING_CACHE_MEMORY_MB = int(os.getenv("EMBEDDING_CACHE_MEMORY_MB", "32"))
+except ValueError:
+    EMBEDDING_CACHE_MEMORY_MB = 32
+
+try:
+    EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "500000"))
+except ValueError:
+    EMBEDDING_CACHE_MAX_ROWS = 500000
+
+# Query-vector cache in front of embed_query for /search and /chat
+try:
+    QUERY_CACHE_TTL_SECONDS = int(os.getenv("QUERY_CACHE_TTL_SECONDS", "600"))
+except ValueError:
+    QUERY_CACHE_TTL_SECONDS = 600
+
+# 0 disables the query cache
+try:
+    QUERY_CACHE_MEMORY_MB = int(os.getenv("QUERY_CACHE_MEMORY_MB", "8"))
+except ValueError:
+    QUERY_CACHE_MEMORY_MB = 8
+
+# Local (fastembed) embedding engine: "thread" runs LOCAL_EMBED_WORKERS
+# concurrent inferences on one shared ONNX session, "process" runs one model
+# replica per worker process (more throughput, ~150 MB RSS per worker).
+LOCAL_EMBED_MODE = os.getenv("LOCAL_EMBED_MODE", "thread").lower()
+
+try:
+    LOCAL_EMBED_WORKERS = int(os.getenv("LOCAL_EMBED_WORKERS", "1"))
+except ValueError:
+    LOCAL_EMBED_WORKERS = 1
+
+# ONNX intra-op threads per session
+try:
+    LOCAL_EMBED_THREADS = int(os.getenv("LOCAL_EMBED_THREADS", "1"))
+except ValueError:
+    LOCAL_EMBED_THREADS = 1
+
+# Max queued document sub-batches before ingestion callers wait. Query
+# embeddings are never bounded and always run ahead of document work.
+try:
+    LOCAL_EMBED_QUEUE_SIZE = int(os.getenv("LOCAL_EMBED_QUEUE_SIZE", "64"))
+except ValueError:
+    LOCAL_EMBED_QUEUE_SIZE = 64
+
+try:
+    LOCAL_EMBED_SUB_BATCH = int(os.getenv("LOCAL_EMBED_SUB_BATCH", "16"))
+except ValueError:
+    LOCAL_EMBED_SUB_BATCH = 16
+
+# Concurrent embed_query calls arriving within this window are embedded in a
+# single model/API call of up to QUERY_BATCH_MAX texts. QUERY_BATCH_MAX=1
+# disables coalescing.
+try:
+    QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+except ValueError:
+    QUERY_BATCH_WINDOW_MS = 5.0
+
+try:
+    QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+except ValueError:
+    QUERY_BATCH_MAX = 32
+
+# OpenAI embedding quota. The limiter starts from these and then follows the
+# x-ratelimit-* headers OpenAI returns, so they only need to be roughly right.
+try:
+    OPENAI_EMBED_RPM = int(os.getenv("OPENAI_EMBED_RPM", "3000"))
+except ValueError:
+    OPENAI_EMBED_RPM = 3000
+
+try:
+    OPENAI_EMBED_TPM = int(os.getenv("OPENAI_EMBED_TPM", "1000000"))
+except ValueError:
+    OPENAI_EMBED_TPM = 1000000
+
+# Tokens per embeddings.create request and requests in flight per
+# embed_documents call
+try:
+    OPENAI_EMBED_BATCH_TOKENS = int(os.getenv("OPENAI_EMBED_BATCH_TOKENS", "50000"))
+except ValueError:
+    OPENAI_EMBED_BATCH_TOKENS = 50000
+
+try:
+    OPENAI_EMBED_CONCURRENCY = int(os.getenv("OPENAI_EMBED_CONCURRENCY", "4"))
+except ValueError:
+    OPENAI_EMBED_CONCURRENCY = 4
+
+# /chat context: the best chunk of each of the top CHAT_CONTEXT_SOURCES
+# bookmarks plus up to CHAT_CONTEXT_NEIGHBOURS chunks either side of it, cut
+# off at CHAT_CONTEXT_TOKENS prompt tokens.
+try:
+    CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
+except ValueError:
+    CHAT_CONTEXT_TOKENS = 3000
+
+try:
+    CHAT_CONTEXT_SOURCES = int(os.getenv("CHAT_CONTEXT_SOURCES", "3"))
+except ValueError:
+    CHAT_CONTEXT_SOURCES = 3
+
+try:
+    CHAT_CONTEXT_NEIGHBOURS = int(os.getenv("CHAT_CONTEXT_NEIGHBOURS", "1"))
+except ValueError:
+    CHAT_CONTEXT_NEIGHBOURS = 1
+
+# Hybrid search: fuse pgvector ranking with Postgres full-text rankings
+# (chunk text, title/url) by reciprocal rank fusion, score = sum 1/(k + rank)
+SEARCH_HYBRID = os.getenv("SEARCH_HYBRID", "true").lower() in ("1", "true", "yes")
+
+try:
+    SEARCH_RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))
+except ValueError:
+    SEARCH_RRF_K = 60
+
+# Users with at most this many chunks are searched exactly (no HNSW); larger
+# ones use the HNSW index with the given pgvector (>= 0.8) iterative scan
+# mode: "strict_order", "relaxed_order" or "off".
+try:
+    SEARCH_EXACT_MAX_CHUNKS = int(os.getenv("SEARCH_EXACT_MAX_CHUNKS", "10000"))
+except ValueError:
+    SEARCH_EXACT_MAX_CHUNKS = 10000
+
+SEARCH_ITERATIVE_SCAN = os.getenv("SEARCH_ITERATIVE_SCAN", "strict_order").lower()
+if SEARCH_ITERATIVE_SCAN not in ("strict_order", "relaxed_order", "off"):
+    raise ValueError(f"Unknown SEARCH_ITERATIVE_SCAN: '{SEARCH_ITERATIVE_SCAN}'")
+
+# HNSW search breadth per query (raised to the candidate count when lower),
+# chunk candidates fetched per requested result, and the cap adaptive
+# widening may grow them to when too few pass the distance threshold
+try:
+    SEARCH_EF_SEARCH = int(os.getenv("SEARCH_EF_SEARCH", "40"))
+except ValueError:
+    SEARCH_EF_SEARCH = 40
+
+try:
+    SEARCH_CANDIDATE_MULTIPLIER = int(os.getenv("SEARCH_CANDIDATE_MULTIPLIER", "4"))
+except ValueError:
+    SEARCH_CANDIDATE_MULTIPLIER = 4
+
+try:
+    SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "400"))
+except ValueError:
+    SEARCH_MAX_CANDIDATES = 400
+
+# HNSW build parameters, used when lifespan creates the indexes. Changing
+# them needs the existing index dropped first (CREATE INDEX IF NOT EXISTS).
+try:
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+except ValueError:
+    HNSW_M = 16
+
+try:
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+except ValueError:
+    HNSW_EF_CONSTRUCTION = 64
+
+# Re-embedding jobs: bookmarks per checkpointed batch, batches embedding
+# concurrently within a job, jobs run at once per worker, seconds without a
+# heartbeat before another worker resumes a job, and the sweep interval
+try:
+    REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "32"))
+except ValueError:
+    REEMBED_BATCH_SIZE = 32
+
+try:
+    REEMBED_CONCURRENCY = int(os.getenv("REEMBED_CONCURRENCY", "2"))
+except ValueError:
+    REEMBED_CONCURRENCY = 2
+
+try:
+    REEMBED_MAX_JOBS = int(os.getenv("REEMBED_MAX_JOBS", "2"))
+except ValueError:
+    REEMBED_MAX_JOBS = 2
+
+try:
+    REEMBED_STALE_SECONDS = float(os.getenv("REEMBED_STALE_SECONDS", "300"))
+except ValueError:
+    REEMBED_STALE_SECONDS = 300.0
+
+try:
+    REEMBED_POLL_SECONDS = float(os.getenv("REEMBED_POLL_SECONDS", "30"))
+except ValueError:
+    REEMBED_POLL_SECONDS = 30.0
+
+# Chunk size and overlap in tokens (cl100k_base, see tokenizer.py) per
+# provider. bge-small reads at most 512 of its own (more granular) tokens;
+# OpenAI models take far longer inputs, but smaller chunks retrieve better.
+try:
+    LOCAL_CHUNK_TOKENS = int(os.getenv("LOCAL_CHUNK_TOKENS", "256"))
+except ValueError:
+    LOCAL_CHUNK_TOKENS = 256
+
+try:
+    LOCAL_CHUNK_OVERLAP = int(os.getenv("LOCAL_CHUNK_OVERLAP", "32"))
+except ValueError:
+    LOCAL_CHUNK_OVERLAP = 32
+
+try:
+    OPENAI_CHUNK_TOKENS = int(os.getenv("OPENAI_CHUNK_TOKENS", "512"))
+except ValueError:
+    OPENAI_CHUNK_TOKENS = 512
+
+try:
+    OPENAI_CHUNK_OVERLAP = int(os.getenv("OPENAI_CHUNK_OVERLAP", "64"))
+except ValueError:
+    OPENAI_CHUNK_OVERLAP = 64
+
+# Memory governor (memory_governor.py): RSS watermarks in MB above which
+# freed heap is trimmed (soft) or a full collection runs first (hard, at
+# most once per cooldown), checked every MEMORY_CHECK_SECONDS; 0 disables
+try:
+    MEMORY_SOFT_LIMIT_MB = int(os.getenv("MEMORY_SOFT_LIMIT_MB", "384"))
+except ValueError:
+    MEMORY_SOFT_LIMIT_MB = 384
+
+try:
+    MEMORY_HARD_LIMIT_MB = int(os.getenv("MEMORY_HARD_LIMIT_MB", "448"))
+except ValueError:
+    MEMORY_HARD_LIMIT_MB = 448
+
+try:
+    MEMORY_CHECK_SECONDS = float(os.getenv("MEMORY_CHECK_SECONDS", "5"))
+except ValueError:
+    MEMORY_CHECK_SECONDS = 5.0
+
+try:
+    MEMORY_COLLECT_COOLDOWN_SECONDS = float(
+        os.getenv("MEMORY_COLLECT_COOLDOWN_SECONDS", "30")
+    )
+except ValueError:
+    MEMORY_COLLECT_COOLDOWN_SECONDS = 30.0
+
+# Background ingestion (ingest_queue.py): workers per process, attempts
+# before a job is marked failed, first retry delay (doubling per attempt),
+# seconds before a job whose worker vanished is claimed again, poll interval
+try:
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+except ValueError:
+    INGEST_WORKERS = 2
+
+try:
+    INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+except ValueError:
+    INGEST_MAX_ATTEMPTS = 5
+
+try:
+    INGEST_RETRY_SECONDS = float(os.getenv("INGEST_RETRY_SECONDS", "10"))
+except ValueError:
+    INGEST_RETRY_SECONDS = 10.0
+
+try:
+    INGEST_STALE_SECONDS = float(os.getenv("INGEST_STALE_SECONDS", "600"))
+except ValueError:
+    INGEST_STALE_SECONDS = 600.0
+
+try:
+    INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "5"))
+except ValueError:
+    INGEST_POLL_SECONDS = 5.0
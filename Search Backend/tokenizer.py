@@ -0,0 +1,65 @@
+from functools import lru_cache
+from typing import Any, List
+
+
+@lru_cache(maxsize=None)
+def _get_encoding() -> Any:
+    """
+    cl100k_base, loaded on first use rather than at import. tiktoken fetches
+    the BPE file on a cold cache (the Dockerfile pre-fetches it into
+    TIKTOKEN_CACHE_DIR); without tiktoken or the file, counts fall back to
+    the character estimate.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except (ImportError, OSError) as e:
+        print(
+            f"Warning: tiktoken cl100k_base unavailable ({e}); "
+            "estimating tokens as characters / 4."
+        )
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count under cl100k_base when tiktoken is available, otherwise the
+    usual ~4 characters per token estimate (rounded up, so budgets built on
+    it err on the small side).
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """`count_tokens` for many texts; tiktoken encodes the batch in threads."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return [
+            len(tokens)
+            for tokens in encoding.encode_batch(texts, disallowed_special=())
+        ]
+    return [len(t) // 4 + 1 for t in texts]
+
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """Cuts `text` into consecutive pieces of at most `max_tokens` tokens."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [
+            encoding.decode(tokens[i:i + max_tokens])
+            for i in range(0, len(tokens), max_tokens)
+        ]
+    step = max_tokens * 4
+    return [text[i:i + step] for i in range(0, len(text), step)]
@@ -0,0 +1,80 @@
+import hashlib
+import struct
+from typing import Any, List, Type
+from uuid import UUID, uuid4
+import numpy as np
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+COLUMNS = [
+    "id", "bookmark_id", "user_id", "chunk_index", "chunk_text", "chunk_hash",
+    "embedding",
+]
+
+# PGCOPY signature, flags and header extension length; then per tuple a
+# field count and length-prefixed fields; -1 ends the stream
+_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_TRAILER = struct.pack(">h", -1)
+_TUPLE = struct.pack(">hi", len(COLUMNS), 16)  # field count + id length
+_UUID_LEN = struct.pack(">i", 16)
+_HASH_LEN = struct.pack(">i", 64)
+_INT4 = struct.Struct(">ii")
+_LEN = struct.Struct(">i")
+
+
+def encode_embeddings(
+    user_id: str, rows: List[tuple[UUID, int, str]], vectors: Any
+) -> bytes:
+    """
+    Encodes (bookmark_id, chunk_index, chunk_text) rows of one user and their
+    vectors in COPY binary format. `vectors` (normally a provider's float32
+    matrix) is byte-swapped to big-endian in one pass, so each row's vector
+    is a single slice of it in pgvector's wire format rather than a
+    float-by-float text rendering.
+    """
+    matrix = np.asarray(vectors, dtype=">f4")
+    dim = matrix.shape[1]
+    vector_head = struct.pack(">iHH", 4 + 4 * dim, dim, 0)
+    user = user_id.encode("utf-8")
+    user_field = _LEN.pack(len(user)) + user
+
+    parts = [_HEADER]
+    for (bookmark_id, chunk_index, chunk_text), vector in zip(rows, matrix):
+        text = chunk_text.encode("utf-8")
+        parts += (
+            _TUPLE, uuid4().bytes,
+            _UUID_LEN, bookmark_id.bytes,
+            user_field,
+            _INT4.pack(4, chunk_index),
+            _LEN.pack(len(text)), text,
+            _HASH_LEN, hashlib.sha256(text).hexdigest().encode("ascii"),
+            vector_head, vector.tobytes(),
+        )
+    parts.append(_TRAILER)
+    return b"".join(parts)
+
+
+async def copy_embeddings(
+    session: AsyncSession,
+    model_cls: Type[Any],
+    user_id: str,
+    rows: List[tuple[UUID, int, str]],
+    vectors: np.ndarray,
+) -> None:
+    """
+    Bulk-writes chunk rows of one user and their vectors with a single binary
+    COPY on the session's connection, bypassing per-row ORM INSERTs. Runs
+    inside the session's current transaction, so the caller must already
+    have executed a statement on the session (asyncpg opens the transaction
+    lazily). pgvector's asyncpg codec is not registered for this: globally
+    it would change how SQLAlchemy binds vector query parameters.
+    """
+    if not rows:
+        return
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_to_table(  # type: ignore[union-attr]
+        model_cls.__tablename__,
+        source=encode_embeddings(user_id, rows, vectors),
+        columns=COLUMNS,
+        format="binary",
+    )